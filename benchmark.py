@@ -0,0 +1,145 @@
+"""
+Python script to benchmark steps of the pipeline on synthetic data.
+"""
+
+import argparse
+import json
+import sys
+
+from includes import benchmark
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Function to parse the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[3, 10, 30, 100],
+        help="Numbers of artists of the synthetic corpora.",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--suite",
+        action="store_true",
+        help="Benchmark all pipeline stages instead and save the results as JSON.",
+    )
+    parser.add_argument(
+        "--songs",
+        type=int,
+        nargs="+",
+        default=[150, 300, 600, 1200],
+        help="Numbers of songs of the synthetic corpora for --suite.",
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark_results.json",
+        help="File to save the --suite results to.",
+    )
+    parser.add_argument(
+        "--compare",
+        default=None,
+        help="Results file of an earlier --suite run to compare with.",
+    )
+    parser.add_argument(
+        "--urls",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Benchmark removing duplicate URLs of crawls of these sizes instead.",
+    )
+    parser.add_argument(
+        "--imports",
+        action="store_true",
+        help="Check the import time of predict.py instead (exits with 1 on regression).",
+    )
+    parser.add_argument(
+        "--max-import-sec",
+        type=float,
+        default=None,
+        help="Maximum import time of predict.py for --imports.",
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    """
+    Main function
+    """
+    args = parse_args()
+
+    if args.imports:
+        result = benchmark.measure_import_time("predict", repeat=args.repeat)
+        print(f"import predict: {round(result['sec'], 3)} sec")
+
+        # Slowest imports by cumulative time, without their submodules
+        top_level = {k: v for k, v in result["modules"].items() if "." not in k}
+        for name, sec in sorted(top_level.items(), key=lambda x: -x[1])[:10]:
+            print(f"{name:<32}{sec:>10.3f}")
+
+        problems = benchmark.check_import_time(result, max_sec=args.max_import_sec)
+        for problem in problems:
+            print(f"Regression: {problem}")
+        sys.exit(1 if problems else 0)
+
+    if args.urls:
+        print(
+            f"{'urls':>10}{'kept':>10}{'old (s)':>10}{'new (s)':>10}{'norm. (s)':>10}"
+        )
+        for result in benchmark.compare_remove_duplicate_urls(
+            args.urls, repeat=args.repeat
+        ):
+            print(
+                f"{result['urls']:>10}{result['kept']:>10}{result['sec_old']:>10.4f}"
+                f"{result['sec_new']:>10.4f}{result['sec_normalized']:>10.4f}"
+            )
+        return
+
+    if args.suite:
+        results = benchmark.run_suite(args.songs, repeat=args.repeat)
+
+        print(
+            f"{'stage':<26}{'songs':>8}{'items':>10}{'sec':>10}"
+            f"{'items/s':>12}{'peak MB':>10}"
+        )
+        for result in results["results"]:
+            print(
+                f"{result['stage']:<26}{result['songs']:>8}{result['items']:>10}"
+                f"{result['sec']:>10.4f}{result['items_per_sec']:>12.0f}"
+                f"{result['peak_mb']:>10.1f}"
+            )
+
+        print("\nScaling exponent (time ~ songs^k)")
+        for stage, exponent in results["scaling"].items():
+            print(f"{stage:<26}{exponent:>8.2f}")
+
+        benchmark.save_results(results, args.output)
+
+        if args.compare:
+            with open(args.compare, "r", encoding="utf-8") as file:
+                old = json.load(file)
+
+            print(f"\nCompared with {args.compare} ({old['meta']['commit']})")
+            for result in benchmark.compare_results(old, results):
+                print(
+                    f"{result['stage']:<26}{result['songs']:>8}"
+                    f"{result['sec_old']:>10.4f}{result['sec_new']:>10.4f}"
+                    f"{result['ratio']:>8.2f}x"
+                )
+        return
+
+    print(f"{'function':<24}{'artists':>8}{'rows':>10}{'old (s)':>10}{'new (s)':>10}")
+
+    for result in benchmark.compare_vectorized(args.sizes, repeat=args.repeat):
+        print(
+            f"{result['function']:<24}{result['artists']:>8}{result['rows']:>10}"
+            f"{result['sec_old']:>10.4f}{result['sec_new']:>10.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Python script to crawl the artists of the artist manifest with several
+worker processes sharing a SQLite work queue.
+
+Start it with
+
+    python crawl.py --workers 4
+
+and run it again to resume an interrupted crawl.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from includes import catalogue, crawl, htmlstore, misc
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Function to parse the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes, sharing the rate limit of scrape_rate.",
+    )
+    parser.add_argument(
+        "--pack",
+        action="store_true",
+        help="Move HTML files scraped before into the HTML store instead.",
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Only print the number of artists by status.",
+    )
+
+    return parser.parse_args()
+
+
+def print_status() -> None:
+    """
+    Function to print the number of artists in the queue by status.
+    """
+    connection = crawl.open_queue()
+    status = crawl.queue_status(connection)
+    connection.close()
+
+    for name in ["pending", "claimed", "done", "failed"]:
+        print(f"{name:<10}{status.get(name, 0):>10}")
+
+
+def pack_files() -> None:
+    """
+    Function to move the HTML files of all artists into the HTML store.
+    """
+    connection = htmlstore.open_store()
+    htmlstore.pack_artists(
+        connection,
+        [misc.shorten_artist(artist) for artist in catalogue.get_artist_urls()],
+    )
+    connection.close()
+
+
+def main():
+    """
+    Main function
+    """
+    args = parse_args()
+
+    if args.pack:
+        pack_files()
+        return
+
+    if not args.status:
+        # Add new artists of the manifest, finished artists keep their status
+        connection = crawl.open_queue()
+        count = crawl.enqueue_artists(connection, catalogue.get_artist_urls())
+        connection.close()
+        print(f"Added {count} artists to the queue")
+
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            run_worker = partial(crawl.run_worker, n_workers=args.workers)
+            shards = sum(executor.map(run_worker, [None] * args.workers))
+        print(f"Crawled {shards} shards")
+
+    print_status()
+
+
+if __name__ == "__main__":
+    main()
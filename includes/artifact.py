@@ -0,0 +1,206 @@
+"""
+Helper functions to export the trained model as flat NumPy arrays
+and to load it again for inference.
+
+Every export is written to a new subdirectory of the artifact directory.
+meta.json names the current one and is replaced atomically, so processes
+that memory-mapped an earlier export keep reading complete, unchanged files.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from includes import cache
+from includes.engine import InferenceEngine, check_pipeline
+from settings import conf
+
+# Increase when the layout of the exported files changes
+ARTIFACT_VERSION = 2
+
+# Names of the exported arrays, saved as <name>.npy
+ARRAY_NAMES = [
+    "vocabulary",
+    "term_index",
+    "idf",
+    "feature_log_prob",
+    "class_log_prior",
+    "classes",
+]
+
+# Parameters of the TfidfVectorizer needed to analyze new text
+VECTORIZER_PARAMS = [
+    "lowercase",
+    "token_pattern",
+    "ngram_range",
+    "stop_words",
+    "norm",
+    "use_idf",
+    "sublinear_tf",
+]
+
+
+def export_model(
+    model, dir_path: str | None = None, model_file: str | None = None
+) -> str:
+    """
+    Function to export the vectorizer and NB parameters of a trained
+    pipeline as NumPy arrays. Training-only steps (SMOTE) are left out.
+    The size, modification time and hash of model_file, the pickle the
+    model was saved as, are stored so that the export can be renewed when
+    the pickle changes.
+    """
+    if dir_path is None:
+        dir_path = conf["base_path"] + conf["model_artifact_path"]
+
+    check_pipeline(model)
+
+    vectorizer = model.named_steps["tdidf"]
+    model_nb = model.named_steps["nb"]
+
+    Path(dir_path).mkdir(parents=True, exist_ok=True)
+    export_path = tempfile.mkdtemp(prefix="export-", dir=dir_path)
+    os.chmod(export_path, 0o755)
+
+    # Store the vocabulary sorted, so it can be searched without a dict
+    terms = np.array(list(vectorizer.vocabulary_.keys()))
+    term_index = np.array(list(vectorizer.vocabulary_.values()), dtype=np.int32)
+    order = np.argsort(terms)
+
+    arrays = {
+        "vocabulary": terms[order],
+        "term_index": term_index[order],
+        "idf": vectorizer.idf_.astype(np.float64),
+        # Fortran order makes the transposed matrix used for scoring contiguous
+        "feature_log_prob": np.asfortranarray(model_nb.feature_log_prob_),
+        "class_log_prior": model_nb.class_log_prior_,
+        "classes": np.array(model_nb.classes_, dtype=str),
+    }
+
+    for name, array in arrays.items():
+        np.save(f"{export_path}/{name}.npy", array)
+
+    params = vectorizer.get_params()
+    meta = {
+        "version": ARTIFACT_VERSION,
+        "export": os.path.basename(export_path),
+        "model_file": None if model_file is None else model_stat(model_file),
+        "model_sha256": None if model_file is None else cache.file_hash(model_file),
+        "vectorizer": {
+            k: list(params[k]) if isinstance(params[k], (list, tuple)) else params[k]
+            for k in VECTORIZER_PARAMS
+        },
+    }
+
+    previous = load_meta(dir_path)
+
+    # Switch to the new export in one step, also with concurrent exports
+    with open(f"{export_path}.json", "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+    os.replace(f"{export_path}.json", f"{dir_path}/meta.json")
+
+    # Processes that mapped the replaced export keep their open files
+    if previous is not None and previous.get("export"):
+        shutil.rmtree(f"{dir_path}/{previous['export']}", ignore_errors=True)
+
+    return dir_path
+
+
+def model_stat(model_file: str) -> dict[str, int]:
+    """
+    Function to get the size and modification time of a model file.
+    """
+    stat = os.stat(model_file)
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_meta(dir_path: str) -> dict | None:
+    """
+    Function to load meta.json of an exported model, None if there is none.
+    """
+    if not os.path.isfile(f"{dir_path}/meta.json"):
+        return None
+
+    with open(f"{dir_path}/meta.json", "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def is_current(model_file: str, dir_path: str | None = None) -> bool:
+    """
+    Function to check if the exported model was exported from the current
+    content of model_file. The file is only hashed if its size or
+    modification time changed.
+    """
+    if dir_path is None:
+        dir_path = conf["base_path"] + conf["model_artifact_path"]
+
+    meta = load_meta(dir_path)
+    if meta is None or meta["version"] != ARTIFACT_VERSION:
+        return False
+
+    if meta.get("model_file") == model_stat(model_file):
+        return True
+
+    return meta.get("model_sha256") == cache.file_hash(model_file)
+
+
+def remove_artifact(dir_path: str | None = None) -> None:
+    """
+    Function to remove an exported model, e.g. one left over from a model
+    that was replaced by a model that cannot be exported.
+    """
+    if dir_path is None:
+        dir_path = conf["base_path"] + conf["model_artifact_path"]
+
+    if os.path.isdir(dir_path):
+        shutil.rmtree(dir_path)
+        print(f"Removed exported model {dir_path}")
+
+
+def load_artifact(dir_path: str | None = None, mmap: bool = True) -> InferenceEngine:
+    """
+    Function to load an exported model. With mmap, the arrays are memory-mapped
+    and their pages are shared between processes loading the same files.
+    """
+    if dir_path is None:
+        dir_path = conf["base_path"] + conf["model_artifact_path"]
+
+    # A concurrent export may remove the export meta.json named when read
+    for attempt in range(3):
+        meta = load_meta(dir_path)
+        if meta is None:
+            raise FileNotFoundError(f"No exported model found in {dir_path}")
+
+        if meta["version"] != ARTIFACT_VERSION:
+            raise ValueError(
+                f"Model artifact version {meta['version']} is not supported, "
+                f"export the model again."
+            )
+
+        try:
+            arrays = {
+                name: np.load(
+                    f"{dir_path}/{meta['export']}/{name}.npy",
+                    mmap_mode="r" if mmap else None,
+                )
+                for name in ARRAY_NAMES
+            }
+            break
+        except FileNotFoundError:
+            if attempt == 2:
+                raise
+
+    return InferenceEngine(
+        vocabulary=arrays["vocabulary"],
+        term_index=arrays["term_index"],
+        idf=arrays["idf"],
+        feature_log_prob=arrays["feature_log_prob"],
+        class_log_prior=arrays["class_log_prior"],
+        classes=arrays["classes"],
+        vectorizer_params=meta["vectorizer"],
+    )
@@ -0,0 +1,567 @@
+"""
+Helper functions for benchmarking the pipeline.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from includes import clean, dedup, inference, misc, modelling, parse
+from settings import conf
+
+# Modules only needed for training and plotting, which must not be
+# imported on the way to a prediction
+INFERENCE_EXCLUDED_MODULES = ["matplotlib", "wordcloud", "PIL", "imblearn", "pandas"]
+
+# Song pages in the markup of lyrics.com, with the site's boilerplate
+FIXTURE_PATH = "tests/fixtures/"
+
+
+def make_songs(
+    n_artists: int = 3,
+    n_songs: int = 200,
+    n_lines: int = 25,
+    n_words: int = 8,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """
+    Function to create a synthetic songs DataFrame (title, artist, lyrics).
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"word{i}" for i in range(5000)])
+
+    rows = []
+    for artist_id in range(n_artists):
+        for song_id in range(n_songs):
+            words = rng.choice(vocabulary, size=(n_lines, n_words))
+            lyrics = "\n".join(" ".join(line) for line in words)
+            rows.append((f"Song {song_id}", f"Artist {artist_id}", lyrics))
+
+    return pd.DataFrame(rows, columns=["title", "artist", "lyrics"])
+
+
+def time_function(func, *args, repeat: int = 3) -> tuple[float, object]:
+    """
+    Function to time a function call. Returns the best wall time
+    in seconds out of repeat runs and the result of the last run.
+    """
+    timings = []
+
+    for _ in range(repeat):
+        time_initial = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - time_initial)
+
+    return min(timings), result
+
+
+def _prepare_corpus_loop(df_c: pd.DataFrame) -> tuple[list[str], list[str]]:
+    """
+    Previous, loop-based version of modelling.prepare_corpus.
+    """
+    corpus = []
+    labels = []
+
+    for artist in df_c["artist"].unique():
+        song_lines = df_c[df_c["artist"] == artist]["lyrics"]
+
+        for line in song_lines:
+            corpus.append(line)
+
+        for _ in range(len(song_lines)):
+            labels.append(artist)
+
+    return corpus, labels
+
+
+def _split_lyrics_apply(df_: pd.DataFrame) -> pd.DataFrame:
+    """
+    Previous, apply-based version of misc.split_lyrics_to_lines.
+    """
+    df_ = (
+        df_.set_index(["title", "artist"])
+        .apply(lambda x: x.str.split("\n").explode())
+        .reset_index()
+    )
+
+    df_ = df_[df_["lyrics"].notna()]
+    df_ = df_[df_["lyrics"] != ""]
+
+    return df_
+
+
+def make_song_urls(
+    n_urls: int, duplicate_share: float = 0.2, seed: int = 42
+) -> dict[str, list]:
+    """
+    Function to create synthetic song URLs of three artists, where
+    duplicate_share of the URLs repeat an earlier song.
+    """
+    rng = np.random.default_rng(seed)
+    n_artist_urls = max(n_urls // 3, 1)
+    n_songs = max(int(n_artist_urls * (1 - duplicate_share)), 1)
+
+    song_urls = {}
+    for artist_id in range(3):
+        # Every song once, the rest repeats random songs
+        songs = rng.integers(0, n_songs, size=n_artist_urls)
+        songs[:n_songs] = np.arange(n_songs)
+        rng.shuffle(songs)
+
+        song_urls[f"Artist {artist_id}"] = [
+            f"{conf['base_url']}/lyric/{i}/Artist+{artist_id}/Song+{song:08d}"
+            for i, song in enumerate(songs)
+        ]
+
+    return song_urls
+
+
+def _remove_duplicate_urls_scan(song_urls: dict[str, list]) -> dict[str, list]:
+    """
+    Previous version of clean.remove_duplicate_urls, scanning all kept URLs
+    for every URL.
+    """
+    song_urls_clean = {}
+
+    for artist, urls in song_urls.items():
+        urls_clean = []
+
+        for url in urls:
+            end_of_url = "/".join(url.rsplit("/", 2)[1:3])
+
+            if not any(end_of_url in c for c in urls_clean):
+                urls_clean.append(url)
+
+        song_urls_clean[artist] = urls_clean
+
+    return song_urls_clean
+
+
+def compare_remove_duplicate_urls(sizes: list[int], repeat: int = 3) -> list[dict]:
+    """
+    Function to compare clean.remove_duplicate_urls with its previous version
+    on synthetic crawls with sizes URLs.
+    """
+    results = []
+
+    def remove_duplicates(song_urls, normalize):
+        with redirect_stdout(None):
+            return clean.remove_duplicate_urls(song_urls, normalize=normalize)
+
+    for n_urls in sizes:
+        song_urls = make_song_urls(n_urls)
+
+        time_old, urls_old = time_function(
+            _remove_duplicate_urls_scan, song_urls, repeat=repeat
+        )
+        time_new, urls_new = time_function(
+            remove_duplicates, song_urls, False, repeat=repeat
+        )
+        time_normalized, _ = time_function(
+            remove_duplicates, song_urls, True, repeat=repeat
+        )
+        assert urls_new == urls_old, "remove_duplicate_urls output differs"
+
+        results.append(
+            {
+                "urls": n_urls,
+                "kept": sum(len(urls) for urls in urls_new.values()),
+                "sec_old": time_old,
+                "sec_new": time_new,
+                "sec_normalized": time_normalized,
+            }
+        )
+
+    return results
+
+
+def compare_vectorized(sizes: list[int], repeat: int = 3) -> list[dict]:
+    """
+    Function to compare the vectorized prepare_corpus and split_lyrics_to_lines
+    with their previous versions on synthetic corpora with sizes artists.
+    """
+    results = []
+
+    for n_artists in sizes:
+        songs = make_songs(n_artists=n_artists)
+
+        time_old, lines_old = time_function(_split_lyrics_apply, songs, repeat=repeat)
+        time_new, lines = time_function(
+            misc.split_lyrics_to_lines, songs, repeat=repeat
+        )
+        assert lines.equals(lines_old), "split_lyrics_to_lines output differs"
+
+        results.append(
+            {
+                "function": "split_lyrics_to_lines",
+                "artists": n_artists,
+                "rows": len(lines),
+                "sec_old": time_old,
+                "sec_new": time_new,
+            }
+        )
+
+        time_old, (corpus_old, labels_old) = time_function(
+            _prepare_corpus_loop, lines, repeat=repeat
+        )
+        time_new, (corpus, labels) = time_function(
+            modelling.prepare_corpus, lines, repeat=repeat
+        )
+        assert list(corpus) == corpus_old, "prepare_corpus corpus differs"
+        assert list(labels) == labels_old, "prepare_corpus labels differ"
+
+        results.append(
+            {
+                "function": "prepare_corpus",
+                "artists": n_artists,
+                "rows": len(lines),
+                "sec_old": time_old,
+                "sec_new": time_new,
+            }
+        )
+
+    return results
+
+
+def measure_import_time(module: str = "predict", repeat: int = 3) -> dict:
+    """
+    Function to measure the import time of a module in a fresh interpreter
+    with python -X importtime. Returns the best total time in seconds out of
+    repeat runs and the cumulative time of every imported module.
+    """
+    best_sec, modules = None, {}
+
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=conf["base_path"],
+            env=os.environ,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        # Lines look like "import time: self [us] | cumulative | imported package"
+        run_modules = {}
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            _, cumulative, name = line[len("import time:") :].split("|")
+            run_modules[name.strip()] = int(cumulative) / 1e6
+
+        if best_sec is None or run_modules[module] < best_sec:
+            best_sec, modules = run_modules[module], run_modules
+
+    return {"module": module, "sec": best_sec, "modules": modules}
+
+
+def check_import_time(
+    result: dict, max_sec: float | None = None, excluded: list[str] | None = None
+) -> list[str]:
+    """
+    Function to check a result of measure_import_time for regressions.
+    Returns a list of problems: excluded modules that got imported and
+    the total import time exceeding max_sec.
+    """
+    excluded = INFERENCE_EXCLUDED_MODULES if excluded is None else excluded
+
+    problems = [
+        f"{name} is imported by {result['module']}"
+        for name in excluded
+        if name in result["modules"]
+    ]
+
+    if max_sec is not None and result["sec"] > max_sec:
+        problems.append(
+            f"{result['module']} takes {round(result['sec'], 3)} sec to import "
+            f"(more than {max_sec} sec)"
+        )
+
+    return problems
+
+
+def make_html(title: str, artist: str, lyrics: str, filler: int = 50) -> str:
+    """
+    Function to create a song page with the structure of lyrics.com,
+    padded with filler navigation links like the real pages.
+    """
+    links = "".join(
+        f'<li><a href="/lyric/{i}">Song {i}</a></li>' for i in range(filler)
+    )
+
+    return (
+        f"<html><head><title>{title} Lyrics</title></head><body>"
+        f"<nav><ul>{links}</ul></nav>"
+        f'<h1 id="lyric-title-text">{title}</h1>'
+        f'<h3 class="lyric-artist"><a href="/artist/{artist}">{artist}</a></h3>'
+        f'<pre id="lyric-body-text">{lyrics}</pre>'
+        f"</body></html>"
+    )
+
+
+def load_fixture_pages(dir_path: str | None = None) -> list[str]:
+    """
+    Function to read the HTML song pages in the fixture directory.
+    """
+    if dir_path is None:
+        dir_path = conf["base_path"] + FIXTURE_PATH
+
+    return [
+        file.read_text(encoding="utf-8")
+        for file in sorted(Path(dir_path).glob("*.html"))
+    ]
+
+
+@contextmanager
+def override_conf(**overrides):
+    """
+    Context manager to change settings temporarily.
+    """
+    previous = {key: conf[key] for key in overrides}
+    conf.update(overrides)
+
+    try:
+        yield
+    finally:
+        conf.update(previous)
+
+
+def measure(func, *args, repeat: int = 3, items: int = 1, setup=None) -> dict:
+    """
+    Function to measure a function call: best wall time out of repeat runs,
+    throughput in items per second and peak memory allocated during one
+    extra run traced with tracemalloc. setup is called before every run.
+    """
+    timings = []
+
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        time_initial = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - time_initial)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "items": items,
+        "sec": min(timings),
+        "items_per_sec": items / min(timings) if min(timings) > 0 else None,
+        "peak_mb": peak / 2**20,
+    }
+
+
+def benchmark_stages(n_songs: int, repeat: int = 3, n_single: int = 100) -> list[dict]:
+    """
+    Function to time every stage of the pipeline, from parsing HTML to
+    predicting, on a synthetic corpus of n_songs songs by three artists.
+    Parsing and cleaning are also timed on the fixture pages, repeated
+    to n_songs pages.
+    """
+    songs = make_songs(n_artists=3, n_songs=max(n_songs // 3, 1))
+    pages = [make_html(*row) for row in songs.itertuples(index=False)]
+    artists = {artist: "" for artist in songs["artist"].unique()}
+
+    fixture_pages = (load_fixture_pages() * len(songs))[: len(songs)]
+
+    def parse_pages(pages_: list[str]):
+        return [parse.parse_html(html) for html in pages_]
+
+    results = {
+        "parse_html": measure(parse_pages, pages, repeat=repeat, items=len(pages)),
+    }
+
+    with override_conf(artist_urls=artists):
+        results["clean_data"] = measure(
+            clean.clean_data, songs, repeat=repeat, items=len(songs)
+        )
+
+    if fixture_pages:
+        results["parse_html_fixtures"] = measure(
+            parse_pages, fixture_pages, repeat=repeat, items=len(fixture_pages)
+        )
+
+        fixture_songs = pd.DataFrame(
+            parse_pages(fixture_pages), columns=["title", "artist", "lyrics"]
+        )
+        with override_conf(
+            artist_urls={artist: "" for artist in fixture_songs["artist"].unique()}
+        ):
+            results["clean_data_fixtures"] = measure(
+                clean.clean_data,
+                fixture_songs,
+                repeat=repeat,
+                items=len(fixture_songs),
+            )
+
+    results["dedup_songs"] = measure(
+        dedup.drop_duplicates,
+        songs,
+        "lyrics",
+        dedup.word_shingles,
+        conf["dedup_song_threshold"],
+        "artist",
+        repeat=repeat,
+        items=len(songs),
+    )
+
+    # Write the line corpus to a temporary directory instead of data/
+    with tempfile.TemporaryDirectory() as base_path:
+        os.mkdir(base_path + "/data")
+        with override_conf(base_path=base_path + "/"):
+            results["convert_lyrics_to_lines"] = measure(
+                misc.convert_lyrics_to_lines, songs, repeat=repeat, items=len(songs)
+            )
+
+    lines = misc.split_lyrics_to_lines(songs)
+    results["prepare_corpus"] = measure(
+        modelling.prepare_corpus, lines, repeat=repeat, items=len(lines)
+    )
+
+    corpus, labels = modelling.prepare_corpus(lines)
+
+    # One process, so that tracemalloc sees all allocations
+    results["preprocess_corpus"] = measure(
+        modelling.preprocess_corpus,
+        corpus,
+        1,
+        repeat=repeat,
+        items=len(corpus),
+        setup=modelling.clear_preprocess_cache,
+    )
+
+    corpus_clean = modelling.preprocess_corpus(corpus, n_jobs=1)
+    model = modelling.create_pipeline()
+
+    results["vectorize"] = measure(
+        model.named_steps["tdidf"].fit_transform,
+        corpus_clean,
+        repeat=repeat,
+        items=len(corpus_clean),
+    )
+    results["train"] = measure(
+        model.fit, corpus_clean, labels, repeat=repeat, items=len(corpus_clean)
+    )
+
+    def predict_single():
+        for line in corpus[:n_single]:
+            inference.predict_lines(model, [line])
+
+    results["predict_single"] = measure(
+        predict_single,
+        repeat=repeat,
+        items=min(n_single, len(corpus)),
+        setup=modelling.clear_preprocess_cache,
+    )
+    results["predict_batch"] = measure(
+        inference.predict_lines,
+        model,
+        corpus,
+        repeat=repeat,
+        items=len(corpus),
+        setup=modelling.clear_preprocess_cache,
+    )
+
+    return [
+        {"stage": stage, "songs": len(songs), **result}
+        for stage, result in results.items()
+    ]
+
+
+def scaling_exponents(results: list[dict]) -> dict[str, float]:
+    """
+    Function to fit time ~ songs^k per stage on a log-log scale.
+    k close to 1 means linear scaling with the corpus size.
+    """
+    exponents = {}
+
+    for stage in dict.fromkeys(r["stage"] for r in results):
+        points = [(r["songs"], r["sec"]) for r in results if r["stage"] == stage]
+        if len(points) < 2 or any(sec <= 0 for _, sec in points):
+            continue
+        x, y = np.log(np.array(points)).T
+        exponents[stage] = float(np.polyfit(x, y, 1)[0])
+
+    return exponents
+
+
+def run_suite(sizes: list[int], repeat: int = 3) -> dict:
+    """
+    Function to benchmark all stages for corpora of sizes songs.
+    Returns the results with information on the run, ready to save as JSON.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=conf["base_path"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    results = []
+    for n_songs in sizes:
+        results += benchmark_stages(n_songs, repeat=repeat)
+
+    return {
+        "meta": {
+            "commit": commit,
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "results": results,
+        "scaling": scaling_exponents(results),
+    }
+
+
+def save_results(results: dict, file_name: str) -> None:
+    """
+    Function to save benchmark results as JSON file.
+    """
+    with open(file_name, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+
+    print(f"Results saved as {file_name}")
+
+
+def compare_results(old: dict, new: dict) -> list[dict]:
+    """
+    Function to compare two suite runs stage by stage.
+    A ratio above 1 means the new run is slower.
+    """
+    old_sec = {(r["stage"], r["songs"]): r["sec"] for r in old["results"]}
+
+    return [
+        {
+            "stage": r["stage"],
+            "songs": r["songs"],
+            "sec_old": old_sec[(r["stage"], r["songs"])],
+            "sec_new": r["sec"],
+            "ratio": r["sec"] / old_sec[(r["stage"], r["songs"])],
+        }
+        for r in new["results"]
+        if (r["stage"], r["songs"]) in old_sec
+    ]
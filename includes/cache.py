@@ -0,0 +1,284 @@
+"""
+Helper functions for caching intermediate results on disk.
+"""
+
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+
+from settings import conf
+
+
+def file_hash(path: str) -> str:
+    """
+    Function to compute the SHA-256 hash of a file's content.
+    """
+    sha = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def paths_hash(paths: list[str]) -> str | None:
+    """
+    Function to compute one SHA-256 hash over the content of files and of
+    all files in directories (without partial downloads). Returns None if
+    one of the paths does not exist.
+    """
+    sha = hashlib.sha256()
+
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(
+                str(file)
+                for file in Path(path).rglob("*")
+                if file.is_file() and file.suffix != ".part"
+            )
+        elif os.path.isfile(path):
+            files = [path]
+        else:
+            return None
+
+        for file in files:
+            name = os.path.relpath(file, conf["base_path"])
+            sha.update(f"{name}\0{file_hash(file)}\n".encode())
+
+    return sha.hexdigest()
+
+
+def open_parse_cache(file_path: str | None = None) -> sqlite3.Connection:
+    """
+    Function to open (and create if needed) the SQLite parse cache.
+    """
+    if file_path is None:
+        file_path = conf["base_path"] + conf["parse_cache_file"]
+
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+
+    connection = sqlite3.connect(file_path)
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS parse_cache (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            version TEXT NOT NULL,
+            title TEXT,
+            artist TEXT,
+            lyrics TEXT
+        )
+        """
+    )
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS parse_cache_content (
+            sha256 TEXT PRIMARY KEY,
+            version TEXT NOT NULL,
+            title TEXT,
+            artist TEXT,
+            lyrics TEXT
+        )
+        """
+    )
+
+    return connection
+
+
+def lookup_parsed(
+    connection: sqlite3.Connection, paths: list[str], version: str
+) -> tuple[dict[str, tuple], list[str]]:
+    """
+    Function to look up parse results of files in the cache.
+    A file counts as unchanged if size and mtime match or, failing that,
+    if its content hash matches. Returns the cached results by path and
+    the list of paths that have to be parsed again.
+    """
+    cached = {
+        row[0]: row[1:]
+        for row in connection.execute(
+            "SELECT path, size, mtime_ns, sha256, version, title, artist, lyrics "
+            "FROM parse_cache"
+        )
+    }
+
+    results = {}
+    missing = []
+    touched = []
+
+    for path in paths:
+        entry = cached.get(path)
+
+        if entry is None or entry[3] != version:
+            missing.append(path)
+            continue
+
+        size, mtime_ns, sha256 = entry[:3]
+        stat = os.stat(path)
+
+        if stat.st_size != size or stat.st_mtime_ns != mtime_ns:
+            # File was touched, check if its content changed
+            if stat.st_size != size or file_hash(path) != sha256:
+                missing.append(path)
+                continue
+            touched.append((stat.st_mtime_ns, path))
+
+        results[path] = entry[4:]
+
+    if touched:
+        with connection:
+            connection.executemany(
+                "UPDATE parse_cache SET mtime_ns = ? WHERE path = ?", touched
+            )
+
+    return results, missing
+
+
+def store_parsed(
+    connection: sqlite3.Connection,
+    paths: list[str],
+    parsed: list[tuple],
+    version: str,
+) -> None:
+    """
+    Function to store parse results of files in the cache.
+    """
+    rows = []
+
+    for path, (title, artist, lyrics) in zip(paths, parsed):
+        stat = os.stat(path)
+        rows.append(
+            (
+                path,
+                stat.st_size,
+                stat.st_mtime_ns,
+                file_hash(path),
+                version,
+                title,
+                artist,
+                lyrics,
+            )
+        )
+
+    with connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+
+def prune_parsed(connection: sqlite3.Connection) -> int:
+    """
+    Function to remove cache entries of files that no longer exist.
+    """
+    gone = [
+        (path,)
+        for (path,) in connection.execute("SELECT path FROM parse_cache")
+        if not os.path.isfile(path)
+    ]
+
+    with connection:
+        connection.executemany("DELETE FROM parse_cache WHERE path = ?", gone)
+
+    return len(gone)
+
+
+def lookup_parsed_content(
+    connection: sqlite3.Connection, hashes: list[str], version: str
+) -> dict[str, tuple]:
+    """
+    Function to look up parse results of pages of the HTML store by the
+    hash of their content. Returns the cached results by hash.
+    """
+    results = {}
+
+    for sha256 in hashes:
+        row = connection.execute(
+            "SELECT title, artist, lyrics FROM parse_cache_content "
+            "WHERE sha256 = ? AND version = ?",
+            (sha256, version),
+        ).fetchone()
+
+        if row is not None:
+            results[sha256] = row
+
+    return results
+
+
+def store_parsed_content(
+    connection: sqlite3.Connection,
+    hashes: list[str],
+    parsed: list[tuple],
+    version: str,
+) -> None:
+    """
+    Function to store parse results of pages of the HTML store by the hash
+    of their content.
+    """
+    with connection:
+        connection.executemany(
+            "INSERT OR REPLACE INTO parse_cache_content VALUES (?, ?, ?, ?, ?)",
+            [(sha256, version, *result) for sha256, result in zip(hashes, parsed)],
+        )
+
+
+def lines_hash(lines: list[str]) -> str:
+    """
+    Function to compute the SHA-256 hash of a list of lines.
+    """
+    sha = hashlib.sha256()
+
+    for line in lines:
+        sha.update(line.encode("utf-8", "surrogatepass") + b"\0")
+
+    return sha.hexdigest()
+
+
+def load_preprocessed(key: str, n_lines: int) -> list[str] | None:
+    """
+    Function to load a cached preprocessed corpus of n_lines lines,
+    None if there is no (complete) cache file for key.
+    """
+    file_name = conf["base_path"] + conf["preprocess_cache_path"] + key + ".txt"
+
+    if not os.path.isfile(file_name):
+        return None
+
+    with open(file_name, "r", encoding="utf-8", newline="") as file:
+        lines = file.read().split("\n")
+
+    # The file ends with a newline, so the last element is empty
+    if len(lines) != n_lines + 1:
+        return None
+
+    # Mark as recently used
+    os.utime(file_name)
+
+    return lines[:-1]
+
+
+def store_preprocessed(key: str, lines: list[str]) -> str:
+    """
+    Function to store a preprocessed corpus with one line per row.
+    Older cache files beyond preprocess_cache_keep are removed.
+    """
+    dir_name = conf["base_path"] + conf["preprocess_cache_path"]
+    Path(dir_name).mkdir(parents=True, exist_ok=True)
+
+    with open(dir_name + key + ".part", "w", encoding="utf-8", newline="") as file:
+        file.writelines(line + "\n" for line in lines)
+    os.replace(dir_name + key + ".part", dir_name + key + ".txt")
+
+    # Keep only the most recently used files
+    files = sorted(
+        (entry for entry in os.scandir(dir_name) if entry.name.endswith(".txt")),
+        key=lambda entry: entry.stat().st_mtime_ns,
+        reverse=True,
+    )
+    for entry in files[conf["preprocess_cache_keep"] :]:
+        os.remove(entry.path)
+
+    return dir_name + key + ".txt"
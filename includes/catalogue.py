@@ -0,0 +1,156 @@
+"""
+Helper functions to read the artists to scrape from an artist manifest.
+
+The manifest is a CSV file with the columns artist, url and optionally
+slug, or a JSONL file with one object with these keys per line. Without
+a manifest, the artists in settings.py are used. The short names used for
+the artists' files are stored when they are first assigned.
+"""
+
+import csv
+import json
+import sqlite3
+import zlib
+from collections import Counter
+from contextlib import closing
+from functools import lru_cache
+from pathlib import Path
+
+from includes import misc
+from settings import conf
+
+
+def read_manifest(file_name: str) -> list[dict[str, str]]:
+    """
+    Function to read the entries of a CSV or JSONL artist manifest.
+    """
+    with open(file_name, "r", encoding="utf-8", newline="") as file:
+        if file_name.endswith(".jsonl"):
+            entries = [json.loads(line) for line in file if line.strip()]
+        elif file_name.endswith(".csv"):
+            entries = list(csv.DictReader(file))
+        else:
+            raise ValueError(f"Artist manifest must be .csv or .jsonl: {file_name}")
+
+    for number, entry in enumerate(entries, start=1):
+        if not entry.get("artist") or not entry.get("url"):
+            raise ValueError(f"Entry {number} of {file_name} needs artist and url.")
+
+    return entries
+
+
+def open_slugs(file_path: str | None = None) -> sqlite3.Connection:
+    """
+    Function to open (and create if needed) the table of the artists'
+    assigned short names, stored in the database of the crawl queue.
+    """
+    if file_path is None:
+        file_path = conf["base_path"] + conf["crawl_queue_file"]
+
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+
+    # Autocommit mode, transactions are started explicitly
+    connection = sqlite3.connect(file_path, timeout=60, isolation_level=None)
+    # WAL only works for processes on one machine, not on network file systems
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS artist_slugs (
+            artist TEXT PRIMARY KEY,
+            slug TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+
+    return connection
+
+
+def assign_slugs(
+    entries: list[dict[str, str]], connection: sqlite3.Connection
+) -> dict[str, str]:
+    """
+    Function to assign every artist the short name used for its files.
+    Short names are stored the first time and never change, so adding
+    artists to the manifest doesn't move the files of others. New artists
+    whose short names collide with each other or with an assigned one get
+    a suffix from the hash of their name, unless the manifest sets their
+    slug.
+    """
+    # BEGIN IMMEDIATE takes the write lock, so workers assign the same names
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        slugs = dict(connection.execute("SELECT artist, slug FROM artist_slugs"))
+
+        new = {}
+        for entry in entries:
+            if entry["artist"] in slugs:
+                if entry.get("slug") and entry["slug"] != slugs[entry["artist"]]:
+                    print(
+                        f"Keep short name {slugs[entry['artist']]} of "
+                        f"{entry['artist']} instead of slug {entry['slug']}"
+                    )
+            elif entry["artist"] not in new or entry.get("slug"):
+                new[entry["artist"]] = entry.get("slug")
+
+        # Slugs set in the manifest are used as they are
+        fixed = {artist: slug for artist, slug in new.items() if slug}
+        taken = set(slugs.values())
+        counts = Counter(fixed.values())
+        for artist, slug in fixed.items():
+            if counts[slug] > 1 or slug in taken:
+                raise ValueError(f"Slug {slug} of {artist} is already used.")
+        taken.update(fixed.values())
+
+        generated = {
+            artist: misc.shorten_artist(artist)
+            for artist, slug in new.items()
+            if not slug
+        }
+        counts = Counter(generated.values())
+        for artist, slug in generated.items():
+            if counts[slug] > 1 or slug in taken:
+                generated[artist] = f"{slug}-{zlib.crc32(artist.encode()):08x}"
+
+        connection.executemany(
+            "INSERT INTO artist_slugs VALUES (?, ?)",
+            list(fixed.items()) + list(generated.items()),
+        )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    return {**slugs, **fixed, **generated}
+
+
+@lru_cache(maxsize=None)
+def load_manifest(file_name: str) -> dict[str, str]:
+    """
+    Function to load the artist URLs from a manifest and register the
+    artists' short names (read once per process).
+    """
+    artist_urls: dict[str, str] = {}
+
+    entries = read_manifest(file_name)
+    for entry in entries:
+        url = artist_urls.setdefault(entry["artist"], entry["url"])
+        if url != entry["url"]:
+            raise ValueError(f"Artist {entry['artist']} has different URLs.")
+
+    with closing(open_slugs()) as connection:
+        misc.ARTIST_SLUGS.update(assign_slugs(entries, connection))
+
+    print(f"Loaded {len(artist_urls)} artists from {file_name}")
+
+    return artist_urls
+
+
+def get_artist_urls() -> dict[str, str]:
+    """
+    Function to get the artists to scrape, from the artist manifest if one
+    is set, otherwise from settings.py.
+    """
+    if not conf["artist_manifest"]:
+        return conf["artist_urls"]
+
+    return load_manifest(conf["base_path"] + conf["artist_manifest"])
@@ -2,33 +2,94 @@
 Helper functions for data cleaning.
 """
 
+import re
+from urllib.parse import unquote_plus
+
 import pandas as pd
+from includes import catalogue
 from settings import conf
 
+# Words marking another version of the same song in a title suffix
+VERSION_WORDS = (
+    "live|remaster|remastered|version|edit|mix|remix|demo|acoustic|mono|stereo|"
+    "instrumental|unplugged"
+)
+
+# Parts in brackets with a version word, e.g. "[Live]" or "(Remastered 2011)",
+# but not "(Part 1)"
+BRACKETS_PATTERN = re.compile(
+    rf"\([^)]*\b({VERSION_WORDS})\b[^)]*\)|\[[^\]]*\b({VERSION_WORDS})\b[^\]]*\]"
+)
+
+# Suffixes like " - Live at Wembley" or " - 2011 Remaster"
+VERSION_SUFFIX_PATTERN = re.compile(rf"\s+-\s+.*\b({VERSION_WORDS})\b.*$")
+
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
 
-def remove_duplicate_urls(song_urls: dict[str, list]) -> dict[str, list]:
+def normalize_title(title: str) -> str:
     """
-    Function to remove duplicate URLs.
+    Function to normalize a song title, so that versions of the same song
+    (live, remastered, ...) get the same title.
+    """
+    title = unquote_plus(title).lower()
+    title = BRACKETS_PATTERN.sub(" ", title)
+    title = VERSION_SUFFIX_PATTERN.sub("", title)
+
+    return NON_WORD_PATTERN.sub(" ", title).strip()
+
+
+def url_key(url: str, normalize: bool = True) -> tuple[str, str]:
     """
+    Function to get the (artist, title) key of a song URL ending in
+    /<artist>/<title>.
+    """
+    artist, title = url.rsplit("/", 2)[1:3]
+
+    if normalize:
+        return unquote_plus(artist).lower(), normalize_title(title)
+
+    return artist, title
+
+
+def remove_duplicate_urls(
+    song_urls: dict[str, list], normalize: bool | None = None
+) -> dict[str, list]:
+    """
+    Function to remove duplicate URLs in linear time, keeping one URL per song.
+    With normalize, versions of a song (live, remastered, ...) count as
+    duplicates, too, and the URL with the shortest title is kept.
+    """
+    normalize = conf["dedup_normalize_titles"] if normalize is None else normalize
     song_urls_clean = {}
 
     for artist, urls in song_urls.items():
         urls_clean = []
-        count_append = 0
-        count_remove = 0
+        # Position in urls_clean of the URL kept for each key
+        positions = {}
+        seen_exact = set()
+        count_versions = 0
 
         for url in urls:
-            end_of_url = "/".join(url.rsplit("/", 2)[1:3])
+            key = url_key(url, normalize)
+            key_exact = url_key(url, normalize=False)
 
-            # Check if string already exists in list
-            if not any(end_of_url in c for c in urls_clean):
+            if key not in positions:
+                positions[key] = len(urls_clean)
                 urls_clean.append(url)
-                count_append += 1
-            else:
-                count_remove += 1
+            elif key_exact not in seen_exact:
+                # Another version of the song, keep the one with the shorter title
+                count_versions += 1
+                position = positions[key]
+                if len(key_exact[1]) < len(url_key(urls_clean[position], False)[1]):
+                    urls_clean[position] = url
+
+            seen_exact.add(key_exact)
 
+        count_remove = len(urls) - len(urls_clean)
         print(
-            f"{count_remove} duplicates removed, leaving {count_append} URLs for {artist}."
+            f"{count_remove} duplicates removed ({count_versions} other versions), "
+            f"leaving {len(urls_clean)} URLs for {artist}."
         )
 
         song_urls_clean[artist] = urls_clean
@@ -45,11 +106,8 @@ def clean_data(df_: pd.DataFrame) -> pd.DataFrame:
     df_ = df_[df_["lyrics"] != ""]
 
     # Remove all songs that are not exactly by artists specified
-    filters = []
-    for artist in conf["artist_urls"]:
-        filters.append(df_["artist"].str.lower() == artist.lower())
-    filt = [any(sublist) for sublist in zip(*filters)]
-    df_ = df_[filt]
+    artists = {artist.lower() for artist in catalogue.get_artist_urls()}
+    df_ = df_[df_["artist"].str.lower().isin(artists)]
 
     # Remove all rows where title ends with ]
     df_ = df_[df_["title"].str[-1] != "]"]
@@ -0,0 +1,275 @@
+"""
+Helper functions to crawl many artists with independent workers.
+
+The artists are split into shards and stored in a SQLite work queue.
+Workers (processes on one machine) claim one shard at a time, scrape its
+song lists and songs and mark its artists as done. Workers renew their claim after every artist,
+claims expire after a lease, so shards of crashed workers are picked up
+again, and finished artists are never scraped twice, so a crawl can be
+stopped and resumed at any time.
+"""
+
+import os
+import socket
+import sqlite3
+import time
+import zlib
+from contextlib import closing
+from pathlib import Path
+
+from includes import catalogue, htmlstore, misc, parse, scrape
+from settings import conf
+
+
+def open_queue(file_path: str | None = None) -> sqlite3.Connection:
+    """
+    Function to open (and create if needed) the SQLite crawl queue.
+    """
+    if file_path is None:
+        file_path = conf["base_path"] + conf["crawl_queue_file"]
+
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+
+    # Autocommit mode, transactions are started explicitly
+    connection = sqlite3.connect(file_path, timeout=60, isolation_level=None)
+    # WAL only works for processes on one machine, not on network file systems
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS crawl_queue (
+            artist TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            shard INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            worker TEXT,
+            claimed_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS crawl_queue_shard ON crawl_queue (shard, status)"
+    )
+
+    return connection
+
+
+def get_shard(artist: str, n_shards: int | None = None) -> int:
+    """
+    Function to get the shard of an artist, the same in every process.
+    """
+    n_shards = conf["crawl_shards"] if n_shards is None else n_shards
+
+    return zlib.crc32(artist.encode()) % n_shards
+
+
+def enqueue_artists(connection: sqlite3.Connection, artist_urls: dict[str, str]) -> int:
+    """
+    Function to add artists to the queue. Artists already in the queue keep
+    their status, so this can be run again with a grown manifest.
+    Returns the number of new artists.
+    """
+    count = connection.execute("SELECT COUNT(*) FROM crawl_queue").fetchone()[0]
+
+    connection.execute("BEGIN IMMEDIATE")
+    connection.executemany(
+        "INSERT INTO crawl_queue (artist, url, shard) VALUES (?, ?, ?) "
+        "ON CONFLICT (artist) DO UPDATE SET url = excluded.url",
+        [(artist, url, get_shard(artist)) for artist, url in artist_urls.items()],
+    )
+    connection.execute("COMMIT")
+
+    return connection.execute("SELECT COUNT(*) FROM crawl_queue").fetchone()[0] - count
+
+
+def claim_shard(
+    connection: sqlite3.Connection, worker: str
+) -> tuple[int, dict[str, str]] | None:
+    """
+    Function to claim the pending artists of one shard, including artists
+    whose claim expired. Returns the shard and the claimed artist URLs,
+    or None if nothing is left to do.
+    """
+    now = time.time()
+    expired = now - conf["crawl_lease_sec"]
+    available = "(status = 'pending' OR (status = 'claimed' AND claimed_at < ?))"
+
+    # BEGIN IMMEDIATE takes the write lock, so no other worker claims the shard
+    connection.execute("BEGIN IMMEDIATE")
+    row = connection.execute(
+        f"SELECT shard FROM crawl_queue WHERE {available} ORDER BY shard LIMIT 1",
+        (expired,),
+    ).fetchone()
+
+    if row is None:
+        connection.execute("COMMIT")
+        return None
+
+    connection.execute(
+        "UPDATE crawl_queue SET status = 'claimed', worker = ?, claimed_at = ? "
+        f"WHERE shard = ? AND {available}",
+        (worker, now, row[0], expired),
+    )
+    artist_urls = dict(
+        connection.execute(
+            "SELECT artist, url FROM crawl_queue "
+            "WHERE shard = ? AND status = 'claimed' AND worker = ? AND claimed_at = ?",
+            (row[0], worker, now),
+        )
+    )
+    connection.execute("COMMIT")
+
+    return row[0], artist_urls
+
+
+def renew_claim(connection: sqlite3.Connection, worker: str) -> set[str]:
+    """
+    Function to renew the lease of the artists claimed by a worker
+    (heartbeat). Returns the artists the worker still holds; artists whose
+    lease expired and that were claimed by another worker are missing.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    connection.execute(
+        "UPDATE crawl_queue SET claimed_at = ? "
+        "WHERE status = 'claimed' AND worker = ?",
+        (time.time(), worker),
+    )
+    artists = {
+        artist
+        for (artist,) in connection.execute(
+            "SELECT artist FROM crawl_queue WHERE status = 'claimed' AND worker = ?",
+            (worker,),
+        )
+    }
+    connection.execute("COMMIT")
+
+    return artists
+
+
+def finish_artists(
+    connection: sqlite3.Connection, worker: str, artists: list[str], success: bool
+) -> int:
+    """
+    Function to mark claimed artists as done or, after a failure, as pending
+    again (or failed after crawl_max_attempts attempts). Returns the number
+    of updated artists, artists no longer claimed by the worker are left
+    to the worker that claimed them again.
+    """
+    status = (
+        "'done'"
+        if success
+        else f"CASE WHEN attempts + 1 >= {int(conf['crawl_max_attempts'])} "
+        "THEN 'failed' ELSE 'pending' END"
+    )
+
+    connection.execute("BEGIN IMMEDIATE")
+    count = connection.executemany(
+        f"UPDATE crawl_queue SET status = {status}, attempts = attempts + 1, "
+        "worker = NULL, claimed_at = NULL "
+        "WHERE artist = ? AND status = 'claimed' AND worker = ?",
+        [(artist, worker) for artist in artists],
+    ).rowcount
+    connection.execute("COMMIT")
+
+    if count < len(artists):
+        print(
+            f"Worker {worker}: lost the lease of {len(artists) - count} artists, "
+            "another worker claimed them again"
+        )
+
+    return count
+
+
+def queue_status(connection: sqlite3.Connection) -> dict[str, int]:
+    """
+    Function to count the artists in the queue by status.
+    """
+    return dict(
+        connection.execute("SELECT status, COUNT(*) FROM crawl_queue GROUP BY status")
+    )
+
+
+def crawl_artists(artist_urls: dict[str, str]) -> list[str]:
+    """
+    Function to scrape the song lists and songs of some artists.
+    Returns the artists whose song list and songs were all downloaded.
+    """
+    scrape.scrape_artist_song_list(artist_urls)
+
+    # Only artists whose song list was downloaded can be crawled further
+    path = conf["base_path"] + conf["scrape_path"]
+    available = {
+        artist: url
+        for artist, url in artist_urls.items()
+        if os.path.isfile(f"{path}{misc.shorten_artist(artist)}_full_song_list.html")
+    }
+    scrape.scrape_songs_to_files(available)
+    song_urls = parse.get_song_urls(available)
+
+    if conf["html_store"]:
+        with closing(htmlstore.open_store()) as store:
+            stored = htmlstore.get_keys(
+                store, [misc.shorten_artist(artist) for artist in song_urls]
+            )
+
+        return [
+            artist
+            for artist, urls in song_urls.items()
+            if all(scrape.song_key(artist, url) in stored for url in urls)
+        ]
+
+    return [
+        artist
+        for artist, urls in song_urls.items()
+        if all(os.path.isfile(scrape.song_file_path(artist, url)) for url in urls)
+    ]
+
+
+def run_worker(
+    worker: str | None = None, file_path: str | None = None, n_workers: int = 1
+) -> int:
+    """
+    Function to claim and crawl shards until the queue is empty. The
+    n_workers workers running at the same time share scrape_rate.
+    Returns the number of crawled shards.
+    """
+    if worker is None:
+        worker = f"{socket.gethostname()}-{os.getpid()}"
+
+    scrape.share_rate(n_workers)
+
+    # Register the short names of the manifest's artists in this process
+    catalogue.get_artist_urls()
+
+    connection = open_queue(file_path)
+    count = 0
+
+    try:
+        while (claim := claim_shard(connection, worker)) is not None:
+            shard, artist_urls = claim
+            print(f"Worker {worker}: crawl shard {shard} ({len(artist_urls)} artists)")
+
+            artists = list(artist_urls)
+            for position, artist in enumerate(artists):
+                # Renew the lease after every artist, so that long shards
+                # are not claimed again by another worker
+                if artist not in renew_claim(connection, worker):
+                    print(f"Worker {worker}: lost the lease of {artist}, skip it")
+                    continue
+
+                try:
+                    done = crawl_artists({artist: artist_urls[artist]})
+                except Exception:
+                    finish_artists(
+                        connection, worker, artists[position:], success=False
+                    )
+                    raise
+
+                finish_artists(connection, worker, [artist], success=bool(done))
+            count += 1
+    finally:
+        connection.close()
+
+    print(f"Worker {worker}: queue empty after {count} shards")
+
+    return count
@@ -0,0 +1,165 @@
+"""
+Helper functions to find near-duplicate songs and lines with MinHash
+and locality-sensitive hashing (LSH).
+
+Every text is turned into a set of shingles and a MinHash signature,
+whose rows agree in the share of the texts' Jaccard similarity. The
+signatures are split into bands; only texts sharing a band are compared,
+so the run time grows with the number of texts, not with its square.
+"""
+
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from settings import conf
+
+# Mersenne prime for the hash permutations, small enough that the products
+# of 32 bit shingle hashes and permutation factors fit into 64 bits
+PRIME = 2**31 - 1
+
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+
+def word_shingles(text: str, n: int = 3) -> set[str]:
+    """
+    Function to get the word n-grams of a text (its words if it is shorter).
+    """
+    words = NON_WORD_PATTERN.sub(" ", text.lower()).split()
+
+    if len(words) <= n:
+        return {" ".join(words)} if words else set()
+
+    return {" ".join(words[i : i + n]) for i in range(len(words) - n + 1)}
+
+
+def char_shingles(text: str, n: int = 4) -> set[str]:
+    """
+    Function to get the character n-grams of a text (the text if it is shorter).
+    """
+    text = " ".join(NON_WORD_PATTERN.sub(" ", text.lower()).split())
+
+    if len(text) <= n:
+        return {text} if text else set()
+
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def minhash_signatures(shingle_sets: list[set[str]], num_perm: int) -> np.ndarray:
+    """
+    Function to compute the MinHash signatures (num_perm values per text)
+    of non-empty shingle sets.
+    """
+    # crc32 instead of hash(), so that results are the same in every run
+    hashes = [
+        np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingles), np.uint64, len(shingles)
+        )
+        for shingles in shingle_sets
+    ]
+    values = np.concatenate(hashes) % PRIME
+    starts = np.cumsum([0] + [len(h) for h in hashes[:-1]])
+
+    rng = np.random.default_rng(1)
+    a = rng.integers(1, PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, PRIME, size=num_perm, dtype=np.uint64)
+
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.uint64)
+    for i in range(num_perm):
+        permuted = (values * a[i] % PRIME + b[i]) % PRIME
+        signatures[:, i] = np.minimum.reduceat(permuted, starts)
+
+    return signatures
+
+
+def lsh_bands(num_perm: int, threshold: float) -> int:
+    """
+    Function to choose the number of bands, so that texts with a similarity
+    around threshold become candidates: (1 / bands) ** (1 / rows) ~ threshold.
+    """
+    options = [b for b in range(1, num_perm + 1) if num_perm % b == 0]
+
+    return min(options, key=lambda b: abs((1 / b) ** (b / num_perm) - threshold))
+
+
+def find_clusters(
+    shingle_sets: list[set[str]], threshold: float, num_perm: int | None = None
+) -> np.ndarray:
+    """
+    Function to group texts with an estimated Jaccard similarity of at least
+    threshold. Returns for every text the position of the first text of its
+    cluster (itself if it is no duplicate). Empty texts are never grouped.
+    """
+    num_perm = conf["dedup_num_perm"] if num_perm is None else num_perm
+    cluster = np.arange(len(shingle_sets))
+
+    positions = np.array([i for i, s in enumerate(shingle_sets) if s], dtype=int)
+    if len(positions) < 2:
+        return cluster
+
+    signatures = minhash_signatures([shingle_sets[i] for i in positions], num_perm)
+    bands = lsh_bands(num_perm, threshold)
+    rows = num_perm // bands
+
+    # Union-find over the positions in signatures
+    parent = np.arange(len(positions))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        band_rows = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        buckets = {}
+        for i, key in enumerate(row.tobytes() for row in band_rows):
+            first = buckets.setdefault(key, i)
+            if first == i:
+                continue
+
+            # Compare with the bucket's first text only, so that a large
+            # bucket of identical texts does not cost quadratic time
+            similarity = np.mean(signatures[first] == signatures[i])
+            if similarity >= threshold:
+                root_first, root_i = root(first), root(i)
+                parent[max(root_first, root_i)] = min(root_first, root_i)
+
+    cluster[positions] = positions[[root(i) for i in range(len(positions))]]
+
+    return cluster
+
+
+def drop_duplicates(
+    df_: pd.DataFrame,
+    column: str,
+    shingles,
+    threshold: float,
+    group: str | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Function to drop rows whose column is a near-duplicate of an earlier row
+    (within the same group, e.g. artist). Returns the kept rows and the
+    removed rows with the index of the row they duplicate in "duplicate_of".
+    """
+    texts = df_[column].astype(str).to_numpy()
+    groups = (
+        df_.groupby(group, sort=False).indices.values()
+        if group
+        else [np.arange(len(df_))]
+    )
+
+    # Position of the row every row duplicates (itself if it is no duplicate)
+    duplicate_of = np.arange(len(df_))
+    for rows in groups:
+        cluster = find_clusters([shingles(text) for text in texts[rows]], threshold)
+        duplicate_of[rows] = rows[cluster]
+
+    is_duplicate = duplicate_of != np.arange(len(df_))
+    df_removed = df_[is_duplicate].assign(
+        duplicate_of=df_.index[duplicate_of[is_duplicate]]
+    )
+
+    return df_[~is_duplicate], df_removed
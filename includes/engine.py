@@ -0,0 +1,225 @@
+"""
+Compact inference engine for the trained TF-IDF + MultinomialNB pipeline.
+
+Tokenizes, looks up vocabulary ids, applies idf and l2 normalization and
+computes the class scores as one sparse-dense matrix product, using the
+same operations in the same order as scikit-learn, so that the results
+are identical to the pipeline's.
+"""
+
+import re
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import logsumexp
+
+
+def check_pipeline(model) -> None:
+    """
+    Function to check that a model is a TF-IDF + NB pipeline. Streaming
+    models (HashingVectorizer) have no vocabulary and cannot be converted.
+    """
+    if "tdidf" not in getattr(model, "named_steps", {}):
+        raise ValueError(
+            "Only TF-IDF models can be used with --engine or --artifact, "
+            "not models trained with train_streaming."
+        )
+
+
+class InferenceEngine:
+    """
+    Inference-only model with the classes_/predict/predict_proba
+    interface of the pipeline.
+
+    The vocabulary is either a dict (term -> column) or a sorted array
+    of terms with their columns in term_index.
+    """
+
+    def __init__(
+        self,
+        vocabulary: dict[str, int] | np.ndarray,
+        idf: np.ndarray | None,
+        feature_log_prob: np.ndarray,
+        class_log_prior: np.ndarray,
+        classes: np.ndarray,
+        vectorizer_params: dict,
+        term_index: np.ndarray | None = None,
+    ):
+        self.vocabulary = vocabulary
+        self.term_index = term_index
+        self.feature_log_prob = feature_log_prob
+        # Keep the transposed matrix C-contiguous, so that it is not
+        # copied on every product (exported models store it that way)
+        self.feature_log_prob_t = np.ascontiguousarray(feature_log_prob.T)
+        self.class_log_prior = class_log_prior
+        self.classes_ = classes
+        self.n_features = feature_log_prob.shape[1]
+
+        self.lowercase = vectorizer_params["lowercase"]
+        self.token_pattern = re.compile(vectorizer_params["token_pattern"])
+        self.ngram_range = tuple(vectorizer_params["ngram_range"])
+        self.stop_words = frozenset(vectorizer_params["stop_words"] or [])
+        self.norm = vectorizer_params["norm"]
+        self.sublinear_tf = vectorizer_params["sublinear_tf"]
+
+        self.idf = idf if vectorizer_params["use_idf"] else None
+        self.ones = np.ones(self.n_features)
+
+        if self.norm not in [None, "l2"]:
+            raise ValueError(f"Unsupported norm: {self.norm}")
+
+    @classmethod
+    def from_pipeline(cls, model) -> "InferenceEngine":
+        """
+        Method to create the engine from a fitted TF-IDF + NB pipeline.
+        """
+        check_pipeline(model)
+
+        vectorizer = model.named_steps["tdidf"]
+        model_nb = model.named_steps["nb"]
+
+        params = vectorizer.get_params()
+        if (
+            params["analyzer"] != "word"
+            or params["preprocessor"] is not None
+            or params["tokenizer"] is not None
+            or params["strip_accents"] is not None
+        ):
+            raise ValueError("Only the default word analyzer is supported.")
+
+        return cls(
+            vocabulary=vectorizer.vocabulary_,
+            idf=vectorizer.idf_ if params["use_idf"] else None,
+            feature_log_prob=model_nb.feature_log_prob_,
+            class_log_prior=model_nb.class_log_prior_,
+            classes=model_nb.classes_,
+            vectorizer_params=params,
+        )
+
+    def analyze(self, line: str) -> list[str]:
+        """
+        Method to split a line into the n-grams of its non-stop-word tokens.
+        """
+        if self.lowercase:
+            line = line.lower()
+
+        tokens = [
+            t for t in self.token_pattern.findall(line) if t not in self.stop_words
+        ]
+
+        min_n, max_n = self.ngram_range
+        terms = tokens if min_n == 1 else []
+
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            terms += [" ".join(tokens[i : i + n]) for i in range(len(tokens) - n + 1)]
+
+        return terms
+
+    def lookup(self, terms: list[str]) -> np.ndarray:
+        """
+        Method to get the column of each term, -1 for unknown terms.
+        """
+        if isinstance(self.vocabulary, dict):
+            return np.array(
+                [self.vocabulary.get(term, -1) for term in terms], dtype=np.int64
+            )
+
+        if not terms:
+            return np.empty(0, dtype=np.int64)
+
+        # Use the vocabulary's dtype so it is not cast on every search.
+        # Terms longer than that get truncated and can't be known.
+        terms_array = np.array(terms, dtype=self.vocabulary.dtype)
+        lengths = np.fromiter(map(len, terms), dtype=np.int64, count=len(terms))
+
+        positions = np.searchsorted(self.vocabulary, terms_array)
+        positions[positions == len(self.vocabulary)] = 0
+        known = (self.vocabulary[positions] == terms_array) & (
+            lengths <= self.vocabulary.itemsize // 4
+        )
+
+        return np.where(known, self.term_index[positions], -1)
+
+    def transform(self, lines: list[str]) -> sp.csr_matrix:
+        """
+        Method to turn lines into the (normalized) tf-idf matrix.
+        """
+        terms = []
+        rows = []
+
+        for row, line in enumerate(lines):
+            line_terms = self.analyze(line)
+            terms += line_terms
+            rows += [row] * len(line_terms)
+
+        columns = self.lookup(terms)
+        known = columns >= 0
+
+        # scikit-learn multiplies the counts with a sparse idf diagonal
+        # matrix, which lists the columns of each row in descending order.
+        # Build the counts in that order, so that the following sums add
+        # up the values in the same order.
+        if self.idf is not None:
+            columns = self.n_features - 1 - columns
+
+        # Count (row, column) pairs, sorted by row and column
+        keys, counts = np.unique(
+            np.array(rows, dtype=np.int64)[known] * self.n_features + columns[known],
+            return_counts=True,
+        )
+        indices = keys % self.n_features
+        if self.idf is not None:
+            indices = self.n_features - 1 - indices
+
+        indptr = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(keys // self.n_features, minlength=len(lines)), out=indptr[1:]
+        )
+
+        features = sp.csr_matrix(
+            (counts.astype(np.float64), indices, indptr),
+            shape=(len(lines), self.n_features),
+        )
+
+        if self.sublinear_tf:
+            np.log(features.data, features.data)
+            features.data += 1
+
+        if self.idf is not None:
+            features.data *= self.idf[features.indices]
+
+        if self.norm == "l2":
+            # Sum the squares row by row in storage order (a sparse
+            # matrix-vector product adds them up sequentially, unlike the
+            # pairwise summation of NumPy reductions)
+            squares = sp.csr_matrix(
+                (features.data**2, features.indices, features.indptr),
+                shape=features.shape,
+            )
+            norms = squares @ self.ones
+            norms[norms == 0] = 1
+            features.data /= np.repeat(np.sqrt(norms), np.diff(features.indptr))
+
+        return features
+
+    def predict_joint_log_proba(self, lines: list[str]) -> np.ndarray:
+        """
+        Method to compute the joint log likelihood of every class.
+        """
+        features = self.transform(lines)
+
+        return features @ self.feature_log_prob_t + self.class_log_prior
+
+    def predict_proba(self, lines: list[str]) -> np.ndarray:
+        """
+        Method to predict the class probabilities of lines.
+        """
+        jll = self.predict_joint_log_proba(lines)
+
+        return np.exp(jll - np.atleast_2d(logsumexp(jll, axis=1)).T)
+
+    def predict(self, lines: list[str]) -> np.ndarray:
+        """
+        Method to predict the class of lines.
+        """
+        return self.classes_[np.argmax(self.predict_joint_log_proba(lines), axis=1)]
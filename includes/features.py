@@ -0,0 +1,150 @@
+"""
+Helper functions to train on an integer-encoded corpus.
+
+The preprocessed lines are tokenized once, the way TfidfVectorizer would
+tokenize them, and stored as int32 token ids in one flat array. N-gram
+counts are built from these ids with NumPy, so that the lines are not
+joined and split again for every fold and feature setting, and the
+fitted vectorizer is a regular TfidfVectorizer that accepts raw text.
+"""
+
+import re
+from array import array
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+
+# Default token pattern of the scikit-learn vectorizers
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def encode_corpus(
+    corpus_: list[str], stop_words: list[str]
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Function to encode preprocessed lines as token ids, lowercased and
+    without stop words like in TfidfVectorizer. Returns the ids of all
+    lines in one int32 array, the start of every line in it (plus the end)
+    and the vocabulary (id -> token).
+    """
+    stop_words = set(stop_words)
+    ids: dict[str, int] = {}
+    tokens = array("i")
+    offsets = array("q", [0])
+
+    for line in corpus_:
+        tokens.extend(
+            ids.setdefault(token, len(ids))
+            for token in TOKEN_PATTERN.findall(line.lower())
+            if token not in stop_words
+        )
+        offsets.append(len(tokens))
+
+    vocabulary = np.array(list(ids), dtype=object)
+
+    return (
+        np.frombuffer(tokens, dtype=np.int32),
+        np.frombuffer(offsets, dtype=np.int64),
+        vocabulary,
+    )
+
+
+def count_ngrams(
+    tokens: np.ndarray,
+    offsets: np.ndarray,
+    vocabulary: np.ndarray,
+    ngram_range: tuple[int, int],
+) -> tuple[sp.csr_matrix, np.ndarray]:
+    """
+    Function to count the n-grams of encoded lines. Returns the count matrix
+    (lines x n-grams) and the n-grams, sorted like the features of
+    TfidfVectorizer.
+    """
+    min_n, max_n = ngram_range
+    n_vocab = max(len(vocabulary), 1)
+
+    # n-grams are numbered as base-n_vocab numbers of their token ids
+    if n_vocab**max_n >= 2**63:
+        raise ValueError(f"Vocabulary too large for {max_n}-grams: {n_vocab}")
+
+    offsets = offsets.astype(np.int64)
+    line_of_token = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+    rows, columns, names = [], [], []
+    for n in range(min_n, max_n + 1):
+        # Start of every n-gram that ends in the same line
+        starts = np.arange(max(len(tokens) - n + 1, 0))
+        starts = starts[line_of_token[starts] == line_of_token[starts + n - 1]]
+
+        keys = np.zeros(len(starts), dtype=np.int64)
+        for k in range(n):
+            keys = keys * n_vocab + tokens[starts + k]
+
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+
+        # Decode the token ids of every distinct n-gram
+        parts = [
+            vocabulary[unique_keys // n_vocab ** (n - 1 - k) % n_vocab]
+            for k in range(n)
+        ]
+
+        rows.append(line_of_token[starts])
+        columns.append(inverse + sum(len(n_names) for n_names in names))
+        names.append(np.array([" ".join(ngram) for ngram in zip(*parts)], object))
+
+    names = np.concatenate(names)
+    order = np.argsort(names, kind="stable")
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    counts = sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.int64), (rows, position[columns])),
+        shape=(len(offsets) - 1, len(names)),
+    )
+    counts.sum_duplicates()
+
+    return counts, names[order]
+
+
+def tfidf_split(
+    counts: sp.csr_matrix, train: np.ndarray, test: np.ndarray
+) -> tuple[sp.csr_matrix, sp.csr_matrix]:
+    """
+    Function to get the TF-IDF features of the train and test lines, as if a
+    TfidfVectorizer with default settings was fitted on the train lines only: n-grams missing from
+    them are left out and the IDF is computed on them.
+    """
+    counts_train = counts[train]
+    used = np.flatnonzero(counts_train.getnnz(axis=0))
+
+    transformer = TfidfTransformer().fit(counts_train[:, used])
+
+    return (
+        transformer.transform(counts_train[:, used]),
+        transformer.transform(counts[test][:, used]),
+    )
+
+
+def fit_vectorizer(
+    counts: sp.csr_matrix, ngrams: np.ndarray, **params
+) -> tuple[TfidfVectorizer, sp.csr_matrix]:
+    """
+    Function to create a TfidfVectorizer fitted on the counted n-grams, so
+    that it transforms raw text like one fitted on the lines themselves.
+    Returns the vectorizer and the TF-IDF features of the lines.
+    """
+    vectorizer = TfidfVectorizer(**params)
+
+    transformer = TfidfTransformer(
+        norm=vectorizer.norm,
+        use_idf=vectorizer.use_idf,
+        smooth_idf=vectorizer.smooth_idf,
+        sublinear_tf=vectorizer.sublinear_tf,
+    ).fit(counts)
+
+    vectorizer.vocabulary_ = {ngram: i for i, ngram in enumerate(ngrams)}
+    vectorizer.idf_ = transformer.idf_
+
+    return vectorizer, transformer.transform(counts)
@@ -0,0 +1,299 @@
+"""
+Helper functions to store scraped HTML pages in compressed shard files.
+
+Pages are compressed with zlib and appended to shard files of up to
+html_store_shard_mb MB. A SQLite index maps every page key (the path the
+page had in the scrape directory, e.g. "eels/eels-Novocaine.html") to the
+SHA-256 hash of its content, and every hash to its position in a shard.
+Pages with the same content are stored once. All pages are compressed
+with a preset dictionary taken from the first stored page, so the
+boilerplate shared by all pages of the website takes almost no space.
+"""
+
+import hashlib
+import os
+import sqlite3
+import zlib
+from functools import lru_cache
+from pathlib import Path
+
+from settings import conf
+
+# zlib only uses the last 32 KB of a preset dictionary
+DICTIONARY_SIZE = 32768
+
+
+def store_path() -> str:
+    """
+    Function to get the directory of the HTML store.
+    """
+    return conf["base_path"] + conf["html_store_path"]
+
+
+def index_file(dir_path: str | None = None) -> str:
+    """
+    Function to get the path of the store's index.
+    """
+    return (store_path() if dir_path is None else dir_path) + "index.sqlite"
+
+
+def open_store(
+    dir_path: str | None = None, check_same_thread: bool = True
+) -> sqlite3.Connection:
+    """
+    Function to open (and create if needed) the index of the HTML store.
+    """
+    dir_path = store_path() if dir_path is None else dir_path
+    Path(dir_path).mkdir(parents=True, exist_ok=True)
+
+    # Autocommit mode, transactions are started explicitly
+    connection = sqlite3.connect(
+        index_file(dir_path),
+        timeout=60,
+        isolation_level=None,
+        check_same_thread=check_same_thread,
+    )
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pages (
+            key TEXT PRIMARY KEY,
+            artist TEXT NOT NULL,
+            sha256 TEXT NOT NULL
+        )
+        """
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS pages_artist ON pages (artist)")
+    connection.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            shard INTEGER NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            size INTEGER NOT NULL
+        )
+        """
+    )
+
+    return connection
+
+
+def shard_file(shard: int, dir_path: str | None = None) -> str:
+    """
+    Function to get the path of a shard file.
+    """
+    return f"{store_path() if dir_path is None else dir_path}shard-{shard:05d}.bin"
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(dir_path: str) -> bytes:
+    """
+    Function to load the store's compression dictionary (once per process).
+    """
+    with open(dir_path + "dictionary.bin", "rb") as file:
+        return file.read()
+
+
+def get_dictionary(data: bytes, dir_path: str) -> bytes:
+    """
+    Function to get the store's compression dictionary, creating it from
+    data if the store is still empty. Called within a write transaction.
+    """
+    file_name = dir_path + "dictionary.bin"
+
+    if not os.path.isfile(file_name):
+        with open(file_name + ".part", "wb") as file:
+            file.write(data[-DICTIONARY_SIZE:])
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(file_name + ".part", file_name)
+
+    return load_dictionary(dir_path)
+
+
+def put_page(
+    connection: sqlite3.Connection, key: str, html: str, dir_path: str | None = None
+) -> bool:
+    """
+    Function to store a page under key ("<artist>/<file name>").
+    Returns True if its content was new and had to be written.
+    """
+    dir_path = store_path() if dir_path is None else dir_path
+    data = html.encode("utf-8")
+    sha256 = hashlib.sha256(data).hexdigest()
+
+    # The write lock also serializes appending to the shard files
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        is_new = (
+            connection.execute(
+                "SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+            is None
+        )
+
+        if is_new:
+            compressor = zlib.compressobj(
+                conf["html_store_level"], zdict=get_dictionary(data, dir_path)
+            )
+            blob = compressor.compress(data) + compressor.flush()
+
+            # Start a new shard when the last one is full
+            shard = connection.execute("SELECT MAX(shard) FROM blobs").fetchone()[0]
+            shard = 0 if shard is None else shard
+            if (
+                os.path.isfile(shard_file(shard, dir_path))
+                and os.path.getsize(shard_file(shard, dir_path))
+                >= conf["html_store_shard_mb"] * 2**20
+            ):
+                shard += 1
+
+            # Bytes of a crashed write are never referenced, appending is safe
+            with open(shard_file(shard, dir_path), "ab") as file:
+                offset = file.tell()
+                file.write(blob)
+                file.flush()
+                os.fsync(file.fileno())
+
+            connection.execute(
+                "INSERT INTO blobs VALUES (?, ?, ?, ?, ?)",
+                (sha256, shard, offset, len(blob), len(data)),
+            )
+
+        connection.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?)",
+            (key, key.split("/")[0], sha256),
+        )
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+    return is_new
+
+
+def get_keys(connection: sqlite3.Connection, artists: list[str]) -> set[str]:
+    """
+    Function to get the keys of the stored pages of artists (short names).
+    """
+    keys = set()
+
+    for artist in artists:
+        keys.update(
+            key
+            for (key,) in connection.execute(
+                "SELECT key FROM pages WHERE artist = ?", (artist,)
+            )
+        )
+
+    return keys
+
+
+def get_locations(
+    connection: sqlite3.Connection, artists: list[str], dir_path: str | None = None
+) -> list[tuple[str, str, tuple[str, int, int]]]:
+    """
+    Function to get the stored pages of artists (short names) as
+    (key, content hash, (shard file, offset, length)) tuples.
+    """
+    dir_path = store_path() if dir_path is None else dir_path
+    locations = []
+
+    for artist in artists:
+        locations += [
+            (key, sha256, (shard_file(shard, dir_path), offset, length))
+            for key, sha256, shard, offset, length in connection.execute(
+                "SELECT key, pages.sha256, shard, offset, length "
+                "FROM pages JOIN blobs ON pages.sha256 = blobs.sha256 "
+                "WHERE artist = ? ORDER BY key",
+                (artist,),
+            )
+        ]
+
+    return locations
+
+
+def get_page(
+    connection: sqlite3.Connection, key: str, dir_path: str | None = None
+) -> str | None:
+    """
+    Function to read the page stored under key, None if there is none.
+    """
+    row = connection.execute(
+        "SELECT shard, offset, length "
+        "FROM pages JOIN blobs ON pages.sha256 = blobs.sha256 WHERE key = ?",
+        (key,),
+    ).fetchone()
+
+    if row is None:
+        return None
+
+    return read_page((shard_file(row[0], dir_path), row[1], row[2]))
+
+
+def read_page(location: tuple[str, int, int]) -> str:
+    """
+    Function to read and decompress a page at (shard file, offset, length).
+    """
+    file_name, offset, length = location
+
+    with open(file_name, "rb") as file:
+        file.seek(offset)
+        blob = file.read(length)
+
+    decompressor = zlib.decompressobj(
+        zdict=load_dictionary(os.path.dirname(file_name) + "/")
+    )
+
+    return (decompressor.decompress(blob) + decompressor.flush()).decode("utf-8")
+
+
+def pack_directory(connection: sqlite3.Connection, artist: str) -> int:
+    """
+    Function to move the HTML files of an artist (short name) from the
+    scrape directory into the store. Files are removed once their page
+    reads back unchanged. Returns the number of packed files.
+    """
+    dir_path = conf["base_path"] + conf["scrape_path"] + artist + "/"
+
+    if not os.path.isdir(dir_path):
+        return 0
+
+    count = 0
+
+    for file_name in sorted(os.listdir(dir_path)):
+        if not file_name.endswith(".html"):
+            continue
+
+        with open(dir_path + file_name, "r", encoding="utf-8") as file:
+            html = file.read()
+
+        key = f"{artist}/{file_name}"
+        put_page(connection, key, html)
+
+        if get_page(connection, key) != html:
+            raise RuntimeError(f"Packed page differs from file {dir_path}{file_name}")
+
+        os.remove(dir_path + file_name)
+        count += 1
+
+    if not os.listdir(dir_path):
+        os.rmdir(dir_path)
+
+    return count
+
+
+def pack_artists(connection: sqlite3.Connection, artists: list[str]) -> int:
+    """
+    Function to move the HTML files of artists (short names) scraped before
+    the HTML store was used into the store. Returns the number of packed files.
+    """
+    count = 0
+
+    for artist in artists:
+        packed = pack_directory(connection, artist)
+        if packed:
+            print(f"Packed {packed} files of {artist} into the HTML store")
+        count += packed
+
+    return count
@@ -0,0 +1,96 @@
+"""
+Helper functions for batch prediction.
+"""
+
+import csv
+import json
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
+import numpy as np
+
+from includes import modelling
+
+
+def read_lines_in_chunks(file: TextIO, chunk_size: int) -> Iterator[list[str]]:
+    """
+    Function to read lines from a file object in chunks of chunk_size lines.
+    """
+    while True:
+        chunk = [line.rstrip("\r\n") for line in islice(file, chunk_size)]
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def predict_lines(model, lines: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Function to predict the artist of a list of lines.
+    Labels and probabilities are taken from a single predict_proba pass.
+    """
+    lines_clean = modelling.preprocess_corpus(lines)
+
+    probabilities = model.predict_proba(lines_clean)
+    best = probabilities.argmax(axis=1)
+
+    predictions = model.classes_[best]
+    probabilities_best = probabilities[np.arange(len(best)), best]
+
+    return predictions, probabilities_best
+
+
+def write_results(
+    file: TextIO,
+    lines: Iterable[str],
+    predictions: Iterable[str],
+    probabilities: Iterable[float],
+    output_format: str = "jsonl",
+    header: bool = False,
+) -> None:
+    """
+    Function to write prediction results as JSONL or CSV.
+    """
+    if output_format == "jsonl":
+        for line, pred, prob in zip(lines, predictions, probabilities):
+            record = {"line": line, "artist": str(pred), "probability": float(prob)}
+            file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    elif output_format == "csv":
+        writer = csv.writer(file)
+        if header:
+            writer.writerow(["line", "artist", "probability"])
+        for line, pred, prob in zip(lines, predictions, probabilities):
+            writer.writerow([line, pred, round(float(prob), 6)])
+
+    else:
+        raise ValueError(f"Invalid output format: {output_format}")
+
+
+def predict_batch(
+    model,
+    input_file: TextIO,
+    output_file: TextIO,
+    chunk_size: int = 10000,
+    output_format: str = "jsonl",
+) -> int:
+    """
+    Function to predict the artist of every line of input_file
+    and write the results to output_file. Returns the number of lines.
+    """
+    count = 0
+
+    for chunk in read_lines_in_chunks(input_file, chunk_size):
+        predictions, probabilities = predict_lines(model, chunk)
+        write_results(
+            output_file,
+            chunk,
+            predictions,
+            probabilities,
+            output_format=output_format,
+            header=count == 0,
+        )
+        count += len(chunk)
+
+    return count
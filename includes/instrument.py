@@ -0,0 +1,260 @@
+"""
+Helper functions to record how much time and memory the stages of the
+pipeline take.
+
+Stages (scraping, parsing, training, ...) are recorded one by one with
+wall time, CPU time, memory and item counts. Inner loops (per URL, per
+file, per batch) are recorded as events, which are summed up by name.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from settings import conf
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Records of the current run, filled by stage() and event()
+STAGES: list[dict] = []
+EVENTS: dict[str, dict] = {}
+LOCK = threading.Lock()
+
+# Records of the stages running right now
+RUNNING: list[dict] = []
+
+# Interval of the RSS samples taken while a stage runs
+RSS_INTERVAL_SEC = 0.05
+
+
+def rss_mb() -> float | None:
+    """
+    Function to get the current resident set size of the process in MB.
+    """
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as file:
+            pages = int(file.read().split()[1])
+    except OSError:
+        return None
+
+    return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def process_peak_rss_mb(children: bool = False) -> float | None:
+    """
+    Function to get the peak resident set size in MB over the lifetime of
+    the process or, with children, of its largest finished child process.
+    """
+    if resource is None:
+        return None
+
+    usage = resource.getrusage(
+        resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    )
+
+    # ru_maxrss is in KB on Linux
+    return usage.ru_maxrss / 2**10
+
+
+def cpu_sec() -> float:
+    """
+    Function to get the CPU time used by the process and its finished
+    child processes (e.g. process pools) in seconds.
+    """
+    times = os.times()
+
+    return times.user + times.system + times.children_user + times.children_system
+
+
+@contextmanager
+def sample_peak_rss(interval: float = RSS_INTERVAL_SEC):
+    """
+    Context manager to sample the resident set size of the process in a
+    background thread. Yields a dict with the largest sample in MB as
+    "peak_rss_mb" (None if the RSS can't be read).
+    """
+    result = {"peak_rss_mb": rss_mb()}
+    stop = threading.Event()
+
+    def sample() -> None:
+        while True:
+            rss = rss_mb()
+            if rss is not None:
+                result["peak_rss_mb"] = max(result["peak_rss_mb"] or 0.0, rss)
+            if stop.wait(interval):
+                return
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+
+    try:
+        yield result
+    finally:
+        stop.set()
+        thread.join()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Context manager to record a stage of the pipeline. Yields the record,
+    so that the number of processed items can be set as record["items"].
+    CPU time and memory are measured for the whole process, so records of
+    stages that ran at the same time as others are marked as overlapped.
+    """
+    record = {"stage": name, "items": None, "overlapped": False}
+    time_initial, cpu_initial = time.perf_counter(), cpu_sec()
+
+    with LOCK:
+        for other in RUNNING:
+            other["overlapped"] = record["overlapped"] = True
+        RUNNING.append(record)
+
+    try:
+        with sample_peak_rss() as rss:
+            yield record
+    finally:
+        with LOCK:
+            RUNNING.remove(record)
+
+        record.update(
+            {
+                "wall_sec": time.perf_counter() - time_initial,
+                "cpu_sec": cpu_sec() - cpu_initial,
+                "rss_mb": rss_mb(),
+                "peak_rss_mb": rss["peak_rss_mb"],
+                "process_peak_rss_mb": process_peak_rss_mb(),
+                "process_peak_rss_children_mb": process_peak_rss_mb(children=True),
+            }
+        )
+        STAGES.append(record)
+
+
+@contextmanager
+def event(name: str, items: int = 1):
+    """
+    Context manager to record one pass of an inner loop, e.g. one URL,
+    file or batch. Events are summed up by name; safe to use from threads.
+    """
+    time_initial = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        sec = time.perf_counter() - time_initial
+
+        with LOCK:
+            summary = EVENTS.setdefault(
+                name, {"count": 0, "items": 0, "sec": 0.0, "max_sec": 0.0}
+            )
+            summary["count"] += 1
+            summary["items"] += items
+            summary["sec"] += sec
+            summary["max_sec"] = max(summary["max_sec"], sec)
+
+
+def print_summary() -> None:
+    """
+    Function to print the recorded stages and events.
+    """
+    print(
+        f"{'stage':<28}{'items':>10}{'wall (s)':>10}{'cpu (s)':>10}"
+        f"{'RSS MB':>10}{'peak MB':>10}"
+    )
+    for record in STAGES:
+        name = record["stage"] + (" *" if record["overlapped"] else "")
+        items = "" if record["items"] is None else record["items"]
+        rss = "" if record["rss_mb"] is None else round(record["rss_mb"], 1)
+        peak = "" if record["peak_rss_mb"] is None else round(record["peak_rss_mb"], 1)
+        print(
+            f"{name:<28}{items:>10}{record['wall_sec']:>10.2f}"
+            f"{record['cpu_sec']:>10.2f}{rss:>10}{peak:>10}"
+        )
+
+    if any(record["overlapped"] for record in STAGES):
+        print("* ran at the same time as other stages, CPU and memory include them")
+
+    if EVENTS:
+        print(f"\n{'event':<28}{'count':>10}{'items':>10}{'sec':>10}{'max (s)':>10}")
+        for name, summary in EVENTS.items():
+            print(
+                f"{name:<28}{summary['count']:>10}{summary['items']:>10}"
+                f"{summary['sec']:>10.2f}{summary['max_sec']:>10.3f}"
+            )
+
+
+def save_metrics(file_name: str | None = None) -> str:
+    """
+    Function to append the metrics of this run as one JSON line to the
+    metrics file, so that runs can be compared over time.
+    """
+    if file_name is None:
+        file_name = conf["base_path"] + conf["metrics_file"]
+
+    Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+
+    run = {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "stages": STAGES,
+        "events": EVENTS,
+    }
+
+    with open(file_name, "a", encoding="utf-8") as file:
+        file.write(json.dumps(run) + "\n")
+
+    print(f"Metrics saved to {file_name}")
+
+    return file_name
+
+
+def run_profiled(func, profiler: str | None = None):
+    """
+    Function to run func under a profiler: "cprofile" writes a pstats file,
+    "pyinstrument" (if installed) an HTML report to the profile directory.
+    """
+    profiler = conf["profile"] if profiler is None else profiler
+
+    if not profiler:
+        return func()
+
+    dir_path = conf["base_path"] + conf["profile_path"]
+    Path(dir_path).mkdir(parents=True, exist_ok=True)
+    name = datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    if profiler == "cprofile":
+        # pylint: disable-next=import-outside-toplevel
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func)
+        finally:
+            profile.dump_stats(f"{dir_path}{name}.prof")
+            print(f"Profile saved as {dir_path}{name}.prof")
+
+    if profiler == "pyinstrument":
+        try:
+            # pylint: disable-next=import-outside-toplevel
+            from pyinstrument import Profiler
+        except ImportError:
+            print("Skip profiling (pyinstrument not installed).")
+            return func()
+
+        profile = Profiler()
+        profile.start()
+        try:
+            return func()
+        finally:
+            profile.stop()
+            with open(f"{dir_path}{name}.html", "w", encoding="utf-8") as file:
+                file.write(profile.output_html())
+            print(f"Profile saved as {dir_path}{name}.html")
+
+    raise ValueError(f"Invalid profiler: {profiler}")
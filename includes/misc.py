@@ -2,23 +2,42 @@
 Other helper functions for the project.
 """
 
+from __future__ import annotations
+
 import os
 import re
-
-import matplotlib.pyplot as plt
-import nltk
-import numpy as np
-import pandas as pd
-from PIL import Image, ImageDraw, ImageFont
-from wordcloud import STOPWORDS, WordCloud
+import sys
+import time
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
 from settings import conf
 
+# Heavy modules (pandas, matplotlib, wordcloud, PIL, nltk) are imported in
+# the functions using them, so that importing misc stays cheap for predict.py
+if TYPE_CHECKING:
+    import pandas as pd
+
+# NLTK resources used for preprocessing and their paths in the data directory
+NLTK_RESOURCES = {"wordnet": "corpora/wordnet", "stopwords": "corpora/stopwords"}
+
+# Where nltk.download gets the data packages from
+NLTK_PACKAGES_URL = (
+    "https://raw.githubusercontent.com/nltk/nltk_data/gh-pages/packages/"
+)
+
+# Short names of artists from the artist manifest, filled by
+# catalogue.load_manifest(), so that artists sharing initials don't share files
+ARTIST_SLUGS: dict[str, str] = {}
+
 
 def shorten_artist(artist: str) -> str:
     """
     Function to shorten the artist name.
     """
+    if artist in ARTIST_SLUGS:
+        return ARTIST_SLUGS[artist]
+
     return (
         "".join(re.findall(r"\b\w", artist)).lower()
         if len(artist.split(" ")) > 1
@@ -26,15 +45,16 @@ def shorten_artist(artist: str) -> str:
     )
 
 
-def convert_lyrics_to_lines(df_: pd.DataFrame) -> pd.DataFrame:
+def split_lyrics_to_lines(df_: pd.DataFrame) -> pd.DataFrame:
     """
-    Function to split the lyrics by line.
+    Function to split the lyrics into one row per non-empty line.
     """
     df_ = (
         # Set columns not to be touched as index
-        df_.set_index(["title", "artist"])
+        df_.set_index(["title", "artist"])["lyrics"]
         # Split and explode the lyrics by newline
-        .apply(lambda x: x.str.split("\n").explode())
+        .str.split("\n")
+        .explode()
         # Reset index
         .reset_index()
     )
@@ -43,11 +63,42 @@ def convert_lyrics_to_lines(df_: pd.DataFrame) -> pd.DataFrame:
     df_ = df_[df_["lyrics"].notna()]
     df_ = df_[df_["lyrics"] != ""]
 
+    return df_
+
+
+def convert_lyrics_to_lines(df_: pd.DataFrame) -> pd.DataFrame:
+    """
+    Function to split the lyrics by line and save them to file.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from includes import dedup, storage
+
+    df_ = split_lyrics_to_lines(df_)
+
     dir_name = conf["base_path"] + "data/"
+
+    # Remove repeated lines of an artist (e.g. choruses), keeping the first
+    if conf["dedup_lines"]:
+        df_, df_removed = dedup.drop_duplicates(
+            df_,
+            "lyrics",
+            dedup.char_shingles,
+            conf["dedup_line_threshold"],
+            group="artist",
+        )
+        df_removed.to_csv(dir_name + "dedup_lines.csv")
+        print(
+            f"Removed {len(df_removed)} near-duplicate lines in "
+            f"{df_removed['duplicate_of'].nunique()} clusters "
+            f"(see {dir_name}dedup_lines.csv)"
+        )
+
     file_name = "songs_by_line.csv"
     df_.to_csv(dir_name + file_name)
     print(f"Saved lyrics by line to {dir_name + file_name}")
 
+    storage.save_corpus(df_)
+
     return df_
 
 
@@ -55,6 +106,9 @@ def wordcloud_create_img(text: str, width: int = 2000, height: int = 1500):
     """
     Function to create an image containing the artist name.
     """
+    # pylint: disable-next=import-outside-toplevel
+    from PIL import Image, ImageDraw, ImageFont
+
     # Define font to be used (downloaded from https://www.cufonfonts.com/font/boldova)
     font_file = "data/Boldova.ttf"
 
@@ -83,6 +137,11 @@ def plot_wordcloud(corpus: str, name: str, shape: str = "rect") -> None:
     """
     Function to plot the wordcloud.
     """
+    # pylint: disable=import-outside-toplevel
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from wordcloud import STOPWORDS, WordCloud
+
     # Some settings
     width = 2000
     height = 1000
@@ -134,20 +193,155 @@ def plot_wordcloud(corpus: str, name: str, shape: str = "rect") -> None:
     return None
 
 
-def download_nltk_data(data_type: str) -> None:
+def set_nltk_data_path() -> str:
+    """
+    Function to put the project's NLTK data directory first on NLTK's
+    search path. Before nltk is imported this is done with the NLTK_DATA
+    environment variable, because importing nltk already loads WordNet.
+    """
+    data_directory = conf["base_path"] + conf["nltk_data_path"]
+
+    paths = [p for p in os.environ.get("NLTK_DATA", "").split(os.pathsep) if p]
+    if data_directory not in paths:
+        os.environ["NLTK_DATA"] = os.pathsep.join([data_directory] + paths)
+
+    nltk_data = sys.modules.get("nltk.data")
+    if nltk_data is not None and data_directory not in nltk_data.path:
+        nltk_data.path.insert(0, data_directory)
+
+    return data_directory
+
+
+def nltk_data_dirs() -> list[str]:
+    """
+    Function to get the directories NLTK searches for data, without
+    importing nltk (importing nltk 3.9 fails if WordNet is missing).
+    """
+    set_nltk_data_path()
+
+    paths = [p for p in os.environ["NLTK_DATA"].split(os.pathsep) if p]
+    paths.append(os.path.expanduser("~/nltk_data"))
+    paths += [
+        os.path.join(sys.prefix, name)
+        for name in ["nltk_data", "share/nltk_data", "lib/nltk_data"]
+    ]
+    paths += [
+        "/usr/share/nltk_data",
+        "/usr/local/share/nltk_data",
+        "/usr/lib/nltk_data",
+        "/usr/local/lib/nltk_data",
+    ]
+
+    return paths
+
+
+def find_nltk_data(data_type: str) -> bool:
     """
-    Function to download the NLTK data.
+    Function to check if an NLTK resource is installed, unpacked or zipped,
+    in one of the directories NLTK searches.
     """
+    resource = NLTK_RESOURCES[data_type]
 
-    if data_type not in ["wordnet", "stopwords"]:
+    return any(
+        os.path.isdir(os.path.join(path, resource))
+        or os.path.isfile(os.path.join(path, resource + ".zip"))
+        for path in nltk_data_dirs()
+    )
+
+
+def nltk_data_url(data_type: str) -> str:
+    """
+    Function to get the URL of an NLTK data package.
+    """
+    return f"{NLTK_PACKAGES_URL}{NLTK_RESOURCES[data_type]}.zip"
+
+
+def fetch_nltk_data(data_type: str) -> None:
+    """
+    Function to download an NLTK data package and unpack it into the
+    project's NLTK data directory like nltk.download, but without nltk.
+    """
+    # pylint: disable=import-outside-toplevel
+    import io
+    import urllib.request
+    import zipfile
+
+    data_directory = set_nltk_data_path()
+    category = os.path.dirname(NLTK_RESOURCES[data_type])
+
+    with urllib.request.urlopen(nltk_data_url(data_type), timeout=60) as response:
+        data = response.read()
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        archive.extractall(os.path.join(data_directory, category))
+
+
+@lru_cache(maxsize=None)
+def download_nltk_data(data_type: str) -> None:
+    """
+    Function to download the NLTK data if it can't be found.
+    Checked once per process, and safe to call before nltk is imported.
+    """
+    if data_type not in NLTK_RESOURCES:
         print("Error: Invalid data type.")
         return None
 
-    data_directory = conf["base_path"] + "data/nltk/"
+    if find_nltk_data(data_type):
+        return None
 
-    # Check if zip is already in the data directory
-    if not os.path.isfile(data_directory + "corpora/" + data_type + ".zip"):
-        print("Downloading NLTK data")
-        nltk.download(data_type, download_dir=data_directory)
+    data_directory = set_nltk_data_path()
+    target = os.path.join(data_directory, os.path.dirname(NLTK_RESOURCES[data_type]))
+    hint = (
+        f"Unzip {nltk_data_url(data_type)} into {target}/ "
+        f"or install the NLTK data globally."
+    )
+
+    if not conf["nltk_download"]:
+        raise LookupError(
+            f"NLTK {data_type} not found in {data_directory} "
+            f"and downloading is disabled. {hint}"
+        )
+
+    print(f"Downloading NLTK {data_type} to {data_directory}", file=sys.stderr)
+    try:
+        fetch_nltk_data(data_type)
+    except OSError as error:
+        raise LookupError(
+            f"NLTK {data_type} could not be downloaded ({error}). {hint}"
+        ) from None
 
     return None
+
+
+def bootstrap_nltk_data() -> None:
+    """
+    Function to make sure all NLTK data is available. Has to run before
+    nltk is imported, because importing nltk already loads WordNet.
+    Raises LookupError if the data can't be found or downloaded.
+    """
+    for data_type in NLTK_RESOURCES:
+        download_nltk_data(data_type)
+
+
+def warm_up_nltk(wordnet: bool = True) -> float:
+    """
+    Function to make sure the NLTK data is available and to load WordNet
+    (unless wordnet is False) and the stopwords up front instead of on the
+    first lemmatized token. Returns the time taken in seconds.
+    """
+    time_initial = time.time()
+
+    bootstrap_nltk_data()
+
+    # pylint: disable-next=import-outside-toplevel
+    from nltk.corpus import stopwords
+
+    stopwords.words("english")
+
+    if wordnet:
+        # pylint: disable-next=import-outside-toplevel
+        from nltk.corpus import wordnet as wordnet_corpus
+
+        wordnet_corpus.ensure_loaded()
+
+    return time.time() - time_initial
@@ -2,67 +2,286 @@
 Helper functions for modelling.
 """
 
+from __future__ import annotations
+
+import json
+import os
 import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+import numpy as np
 
-import joblib
-import pandas as pd
-from imblearn.over_sampling import SMOTE
-from imblearn.pipeline import Pipeline as PipelineIMB
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from nltk.tokenize import TreebankWordTokenizer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import GridSearchCV
-from sklearn.naive_bayes import MultinomialNB
-
-from includes.misc import download_nltk_data
+from includes import cache, instrument
+from includes.misc import bootstrap_nltk_data
 from settings import conf
 
+# Training dependencies (imblearn, sklearn estimators and searches, joblib,
+# pandas) are imported in the functions using them, so that inference only
+# pays for the preprocessing imports. nltk is imported on first use (see
+# load_nltk), so that importing this module has no side effects.
+if TYPE_CHECKING:
+    import pandas as pd
+    from imblearn.pipeline import Pipeline as PipelineIMB
+    from nltk.stem import WordNetLemmatizer
+    from nltk.tokenize import TreebankWordTokenizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+
+# Precompiled token -> lemma table, filled by load_lemma_table()
+LEMMA_TABLE: dict[str, str] = {}
+
+# Increase when the format of the lemma table file changes
+LEMMA_TABLE_VERSION = 1
+
+# Increase when preprocessing changes, so cached preprocessed corpora are invalidated
+PREPROCESS_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def load_nltk():
+    """
+    Function to import nltk once it is needed. Importing nltk already loads
+    WordNet (nltk 3.9), so missing NLTK data is downloaded first. Raises
+    LookupError if the data can't be found or downloaded.
+    """
+    bootstrap_nltk_data()
+
+    # pylint: disable-next=import-outside-toplevel
+    import nltk
+
+    return nltk
 
-def prepare_corpus(df_c: pd.DataFrame) -> tuple[list[str], list[str]]:
+
+@lru_cache(maxsize=None)
+def get_tokenizer() -> TreebankWordTokenizer:
+    """
+    Function to get the tokenizer shared by all calls of preprocess_corpus.
+    """
+    return load_nltk().tokenize.TreebankWordTokenizer()
+
+
+@lru_cache(maxsize=None)
+def get_lemmatizer() -> WordNetLemmatizer:
+    """
+    Function to get the lemmatizer shared by all calls of preprocess_corpus.
+    """
+    return load_nltk().stem.WordNetLemmatizer()
+
+
+def english_stopwords() -> list[str]:
+    """
+    Function to get the English stopwords of NLTK.
+    """
+    return list(load_nltk().corpus.stopwords.words("english"))
+
+
+def prepare_corpus(df_c: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
     """
     Function to prepare the corpus from a dataframe.
+    Lines are grouped by artist in order of first appearance.
+    """
+    corpus, codes, classes = prepare_corpus_encoded(df_c)
+
+    return corpus, classes[codes]
+
+
+def prepare_corpus_encoded(
+    df_c: pd.DataFrame,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Function to prepare the corpus from a dataframe with int32 label codes.
+    Lines are grouped by artist in order of first appearance.
+    Returns the lines, their label codes and the artists (code -> artist).
     """
 
-    corpus = []
-    labels = []
+    # Number artists by first appearance, rows without artist get -1
+    codes, classes = df_c["artist"].factorize()
+
+    # Stable sort keeps the order of lines within each artist
+    order = np.argsort(codes, kind="stable")
+    order = order[codes[order] >= 0]
+
+    corpus = df_c["lyrics"].to_numpy()[order]
 
-    # Create list of song lines and labels
-    for artist in df_c["artist"].unique():
-        song_lines = df_c[df_c["artist"] == artist]["lyrics"]
+    return corpus, codes[order].astype(np.int32), np.asarray(classes, dtype=object)
+
+
+@lru_cache(maxsize=conf["lemma_cache_size"])
+def lemmatize_token(token: str) -> str:
+    """
+    Function to lemmatize a single token (cached).
+    Tokens missing from the lemma table are lemmatized with WordNet.
+    """
+    lemma = LEMMA_TABLE.get(token)
+    if lemma is None:
+        lemma = get_lemmatizer().lemmatize(token)
 
-        for line in song_lines:
-            corpus.append(line)
+    return lemma
 
-        for _ in range(len(song_lines)):
-            labels.append(artist)
 
-    return corpus, labels
+@lru_cache(maxsize=conf["line_cache_size"])
+def preprocess_line(line: str) -> str:
+    """
+    Function to tokenize and lemmatize a single lowercased line (cached).
+    """
+    tokens = get_tokenizer().tokenize(text=line)
+    return " ".join(lemmatize_token(token) for token in tokens)
 
 
-def preprocess_corpus(corpus_: list[str]) -> list[str]:
+def _preprocess_chunk(corpus_: list[str]) -> list[str]:
+    """
+    Function to preprocess a chunk of the corpus in the current process.
+    """
+
+    # Convert to lowercase, tokenize and lemmatize
+    return [preprocess_line(s.lower().strip()) for s in corpus_]
+
+
+def preprocess_corpus(
+    corpus_: list[str], n_jobs: int | None = None, chunk_size: int | None = None
+) -> list[str]:
     """
     Function to preprocess the data for the model.
+    Large corpora are split into chunks and preprocessed by n_jobs processes
+    (-1 for all CPUs); the order of the output matches the input.
     """
+    n_jobs = conf["preprocess_n_jobs"] if n_jobs is None else n_jobs
+    chunk_size = conf["preprocess_chunk_size"] if chunk_size is None else chunk_size
+
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
 
-    # Convert to lowercase
-    corpus_ = [s.lower().strip() for s in corpus_]
+    # Process startup costs more than it saves on small inputs
+    if n_jobs == 1 or len(corpus_) < max(conf["preprocess_min_parallel"], chunk_size):
+        return _preprocess_chunk(corpus_)
 
-    # Tokenize and lemmatize
-    corpus_clean = []
+    chunks = [corpus_[i : i + chunk_size] for i in range(0, len(corpus_), chunk_size)]
 
-    tokenizer = TreebankWordTokenizer()
-    lemmatizer = WordNetLemmatizer()
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks))) as executor:
+        results = executor.map(_preprocess_chunk, chunks)
 
-    for doc in corpus_:
-        tokens = tokenizer.tokenize(text=doc)
-        clean_doc = " ".join(lemmatizer.lemmatize(token) for token in tokens)
-        corpus_clean.append(clean_doc)
+        return [doc for chunk in results for doc in chunk]
+
+
+def preprocess_corpus_cached(corpus_: list[str]) -> list[str]:
+    """
+    Function to preprocess the data for the model, re-using the result
+    stored by an earlier run on the same lines with the same preprocessing.
+    """
+    if not conf["preprocess_cache"]:
+        return preprocess_corpus(corpus_)
+
+    key = (
+        f"{cache.lines_hash(corpus_)[:32]}"
+        f"-v{PREPROCESS_VERSION}-nltk{load_nltk().__version__}"
+    )
+
+    corpus_clean = cache.load_preprocessed(key, len(corpus_))
+    if corpus_clean is not None:
+        print(f"Loaded preprocessed corpus from cache ({key})")
+        return corpus_clean
+
+    corpus_clean = preprocess_corpus(corpus_)
+    cache.store_preprocessed(key, corpus_clean)
 
     return corpus_clean
 
 
+def preprocess_cache_info() -> dict[str, dict]:
+    """
+    Function to get hit/miss statistics of the preprocessing caches.
+    """
+    return {
+        "lemma": lemmatize_token.cache_info()._asdict(),
+        "line": preprocess_line.cache_info()._asdict(),
+    }
+
+
+def clear_preprocess_cache() -> None:
+    """
+    Function to empty the preprocessing caches.
+    """
+    lemmatize_token.cache_clear()
+    preprocess_line.cache_clear()
+
+
+def common_words() -> list[str]:
+    """
+    Function to get common English words for the lemma table:
+    the NLTK stopwords and the words of the optional word list file.
+    """
+    words = english_stopwords()
+
+    file_name = conf["base_path"] + conf["lemma_word_list"]
+    if os.path.isfile(file_name):
+        with open(file_name, "r", encoding="utf-8") as file:
+            words += [word.strip().lower() for word in file if word.strip()]
+
+    return words
+
+
+def build_lemma_table(corpus_: Iterable[str], words: Iterable[str] = ()) -> dict:
+    """
+    Function to lemmatize every token of the (raw) corpus and the given
+    words once with WordNet. Returns a dict token -> lemma.
+    """
+    tokenizer, lemmatizer = get_tokenizer(), get_lemmatizer()
+
+    tokens = set(words)
+    for line in corpus_:
+        tokens.update(tokenizer.tokenize(text=line.lower().strip()))
+
+    return {token: lemmatizer.lemmatize(token) for token in sorted(tokens)}
+
+
+def save_lemma_table(table: dict, file_name: str | None = None) -> str:
+    """
+    Function to save a lemma table as JSON file.
+    """
+    if file_name is None:
+        file_name = conf["base_path"] + conf["lemma_table_file"]
+
+    Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+
+    with open(file_name, "w", encoding="utf-8") as file:
+        json.dump({"version": LEMMA_TABLE_VERSION, "lemmas": table}, file)
+
+    print(f"Lemma table with {len(table)} tokens saved as {file_name}.")
+
+    return file_name
+
+
+def load_lemma_table(file_name: str | None = None) -> int:
+    """
+    Function to load the lemma table used by lemmatize_token.
+    Returns the number of tokens in the table, 0 if there is none.
+    """
+    if file_name is None:
+        if not conf["lemma_table"]:
+            return 0
+        file_name = conf["base_path"] + conf["lemma_table_file"]
+
+    if not os.path.isfile(file_name):
+        return 0
+
+    with open(file_name, "r", encoding="utf-8") as file:
+        data = json.load(file)
+
+    if data["version"] != LEMMA_TABLE_VERSION:
+        raise ValueError(
+            f"Lemma table version {data['version']} is not supported, "
+            f"build the table again."
+        )
+
+    LEMMA_TABLE.clear()
+    LEMMA_TABLE.update(data["lemmas"])
+
+    return len(LEMMA_TABLE)
+
+
 def print_results(
     lyrics: list[str], predictions: list[str], probabilities: list[float]
 ) -> None:
@@ -88,69 +307,437 @@ def print_results(
         )
 
 
-def tune_hyperparameters(corpus_: list[str], labels_: list[str]):
+def create_pipeline() -> PipelineIMB:
     """
-    Function to tune the model's hyperparameters.
+    Function to create the untrained model pipeline.
     """
+    # pylint: disable=import-outside-toplevel
+    from imblearn.over_sampling import SMOTE
+    from imblearn.pipeline import Pipeline as PipelineIMB
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.naive_bayes import MultinomialNB
 
-    # Make sure necessary NLTK files have been downloaded
-    download_nltk_data("wordnet")
-    download_nltk_data("stopwords")
-
-    model = PipelineIMB(
+    return PipelineIMB(
         steps=[
-            ("tdidf", TfidfVectorizer(stop_words=list(stopwords.words("english")))),
+            ("tdidf", TfidfVectorizer(stop_words=english_stopwords())),
             ("smote", SMOTE()),
             ("nb", MultinomialNB()),
         ]
     )
 
+
+def _score_fold(
+    corpus_: np.ndarray,
+    labels_: np.ndarray,
+    train: np.ndarray,
+    test: np.ndarray,
+    vectorizer_params: dict,
+    nb_grid: list[dict],
+) -> tuple[list[float], float, float]:
+    """
+    Function to vectorize one fold once and score all NB parameters on it.
+    Returns the accuracies in the order of nb_grid and the time spent on
+    vectorizing/oversampling and on fitting NB.
+    """
+    # pylint: disable=import-outside-toplevel
+    from imblearn.over_sampling import SMOTE
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.metrics import accuracy_score
+    from sklearn.naive_bayes import MultinomialNB
+
+    time_initial = time.time()
+
+    vectorizer = TfidfVectorizer(stop_words=english_stopwords(), **vectorizer_params)
+    x_train = vectorizer.fit_transform(corpus_[train])
+    x_test = vectorizer.transform(corpus_[test])
+    x_train, y_train = SMOTE().fit_resample(x_train, labels_[train])
+
+    time_vectorize = time.time() - time_initial
+
+    scores = []
+    for nb_params in nb_grid:
+        model = MultinomialNB(**nb_params).fit(x_train, y_train)
+        scores.append(accuracy_score(labels_[test], model.predict(x_test)))
+
+    return scores, time_vectorize, time.time() - time_initial - time_vectorize
+
+
+def _score_fold_encoded(
+    counts, labels_: np.ndarray, train: np.ndarray, test: np.ndarray, nb_grid
+) -> tuple[list[float], float, float]:
+    """
+    Function like _score_fold for n-gram counts of an encoded corpus.
+    """
+    # pylint: disable=import-outside-toplevel
+    from imblearn.over_sampling import SMOTE
+    from sklearn.metrics import accuracy_score
+    from sklearn.naive_bayes import MultinomialNB
+
+    from includes import features
+
+    time_initial = time.time()
+
+    x_train, x_test = features.tfidf_split(counts, train, test)
+    x_train, y_train = SMOTE().fit_resample(x_train, labels_[train])
+
+    time_vectorize = time.time() - time_initial
+
+    scores = []
+    for nb_params in nb_grid:
+        model = MultinomialNB(**nb_params).fit(x_train, y_train)
+        scores.append(accuracy_score(labels_[test], model.predict(x_test)))
+
+    return scores, time_vectorize, time.time() - time_initial - time_vectorize
+
+
+def cached_grid_search(
+    corpus_: list[str],
+    labels_: list[str],
+    param_grid: dict,
+    cv: int = 5,
+    encoded: bool = False,
+) -> tuple[dict, float]:
+    """
+    Function to grid search the pipeline's parameters with cached features.
+    Each fold is vectorized (and oversampled) once per vectorizer setting
+    and all NB parameters are scored on these matrices. With encoded, the
+    lines are encoded as token ids once and the n-grams are counted once per
+    vectorizer setting (only ngram_range can be searched then).
+    Returns the best parameters and their mean cross-validation score.
+    """
+    # pylint: disable=import-outside-toplevel
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+    from includes import features
+
+    corpus_ = np.asarray(corpus_, dtype=object)
+    labels_ = np.asarray(labels_)
+
+    # Same splits as GridSearchCV uses for classifiers
+    folds = list(StratifiedKFold(n_splits=cv).split(corpus_, labels_))
+
+    vectorizer_grid = list(
+        ParameterGrid(
+            {k[7:]: v for k, v in param_grid.items() if k.startswith("tdidf__")}
+        )
+    )
+    nb_grid = list(
+        ParameterGrid({k[4:]: v for k, v in param_grid.items() if k.startswith("nb__")})
+    )
+
+    jobs = [
+        (vectorizer_params, train, test)
+        for vectorizer_params in vectorizer_grid
+        for train, test in folds
+    ]
+    print(
+        f"Fitting {len(folds)} folds for each of {len(vectorizer_grid)} feature "
+        f"settings x {len(nb_grid)} NB candidates"
+    )
+
+    if encoded:
+        if any(set(params) - {"ngram_range"} for params in vectorizer_grid):
+            raise ValueError("Only ngram_range can be searched on encoded lines.")
+
+        tokens, offsets, vocabulary = features.encode_corpus(
+            corpus_, english_stopwords()
+        )
+        del corpus_
+
+        # Count the n-grams of one setting at a time to limit memory
+        results = []
+        for vectorizer_params in vectorizer_grid:
+            counts, _ = features.count_ngrams(
+                tokens,
+                offsets,
+                vocabulary,
+                vectorizer_params.get("ngram_range", (1, 1)),
+            )
+            results += Parallel(n_jobs=-1)(
+                delayed(_score_fold_encoded)(counts, labels_, train, test, nb_grid)
+                for train, test in folds
+            )
+            del counts
+    else:
+        results = Parallel(n_jobs=-1)(
+            delayed(_score_fold)(corpus_, labels_, train, test, params, nb_grid)
+            for params, train, test in jobs
+        )
+
+    print(
+        f"Vectorizing and oversampling: {round(sum(r[1] for r in results), 2)} sec, "
+        f"fitting NB: {round(sum(r[2] for r in results), 2)} sec (summed over jobs)"
+    )
+
+    # Average the scores per candidate
+    mean_scores = {}
+    for (vectorizer_params, _, _), (scores, _, _) in zip(jobs, results):
+        for nb_params, score in zip(nb_grid, scores):
+            params = {f"tdidf__{k}": v for k, v in vectorizer_params.items()}
+            params.update({f"nb__{k}": v for k, v in nb_params.items()})
+            key = tuple(sorted(params.items()))
+            mean_scores[key] = mean_scores.get(key, 0) + score / len(folds)
+
+    # Pick the first best candidate in grid order, like GridSearchCV does
+    best_params, best_score = None, -1.0
+    for params in ParameterGrid(param_grid):
+        score = mean_scores[tuple(sorted(params.items()))]
+        if score > best_score:
+            best_params, best_score = params, score
+
+    return best_params, best_score
+
+
+def fit_encoded(
+    model: PipelineIMB, corpus_: list[str], codes: np.ndarray, classes: np.ndarray
+) -> PipelineIMB:
+    """
+    Function to fit the pipeline on preprocessed lines encoded as token ids
+    and on label codes. The fitted pipeline predicts artists from raw text.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from includes import features
+
+    vectorizer = model.named_steps["tdidf"]
+
+    tokens, offsets, vocabulary = features.encode_corpus(corpus_, vectorizer.stop_words)
+    counts, ngrams = features.count_ngrams(
+        tokens, offsets, vocabulary, vectorizer.ngram_range
+    )
+    del tokens, offsets, vocabulary
+
+    vectorizer, x_train = features.fit_vectorizer(
+        counts, ngrams, **vectorizer.get_params()
+    )
+    del counts, ngrams
+
+    x_train, y_train = model.named_steps["smote"].fit_resample(x_train, codes)
+    model_nb = model.named_steps["nb"].fit(x_train, y_train)
+
+    # Predict artists instead of their codes
+    model_nb.classes_ = classes[model_nb.classes_]
+    model.steps[0] = ("tdidf", vectorizer)
+
+    return model
+
+
+def tune_hyperparameters(
+    corpus_: list[str],
+    labels_: list[str],
+    search: str | None = None,
+    classes_: np.ndarray | None = None,
+):
+    """
+    Function to tune the model's hyperparameters.
+    search is one of "grid" (GridSearchCV), "cached" (grid search with cached
+    features), "halving" (successive halving) or "random" (randomized search).
+    With classes_, labels_ are int32 codes of these classes and the "cached"
+    search and the refit run on the lines encoded as token ids; the other
+    searches decode the labels and run on the text.
+    """
+    # pylint: disable=import-outside-toplevel
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import (
+        GridSearchCV,
+        HalvingGridSearchCV,
+        RandomizedSearchCV,
+    )
+
+    search = conf["search"] if search is None else search
+
+    # Only the cached search trains on label codes, decode them for the others
+    if classes_ is not None and search != "cached":
+        labels_, classes_ = classes_[labels_], None
+
+    # Make sure necessary NLTK files have been downloaded
+    load_nltk()
+
+    model = create_pipeline()
+
     param_grid = {
         "nb__alpha": [0.1, 0.5, 1, 2, 3],
         "nb__fit_prior": [True, False],
         "tdidf__ngram_range": [(1, 1), (1, 2), (1, 3)],
     }
 
-    gscv = GridSearchCV(
-        estimator=model,
-        param_grid=param_grid,
-        scoring="accuracy",
-        cv=5,
-        n_jobs=-1,
-        verbose=1,
-    )
-
     time_initial = time.time()
 
-    # Grid Search cross-validation
-    gscv.fit(corpus_, labels_)
+    if search == "cached":
+        best_params, best_score = cached_grid_search(
+            corpus_, labels_, param_grid, cv=5, encoded=classes_ is not None
+        )
+        print(f"time taken (search): {round(time.time() - time_initial, 2)} sec")
 
-    time_final = time.time()
+        time_refit = time.time()
+        model.set_params(**best_params)
+        if classes_ is None:
+            best_estimator = model.fit(corpus_, labels_)
+        else:
+            best_estimator = fit_encoded(model, corpus_, labels_, classes_)
+            labels_ = classes_[labels_]
+        print(f"time taken (refit): {round(time.time() - time_refit, 2)} sec")
+
+    else:
+        if search == "grid":
+            searcher = GridSearchCV(estimator=model, param_grid=param_grid)
+        elif search == "halving":
+            searcher = HalvingGridSearchCV(
+                estimator=model, param_grid=param_grid, factor=3, random_state=0
+            )
+        elif search == "random":
+            searcher = RandomizedSearchCV(
+                estimator=model,
+                param_distributions=param_grid,
+                n_iter=conf["search_n_iter"],
+                random_state=0,
+            )
+        else:
+            raise ValueError(f"Invalid search: {search}")
 
-    print(f"time taken: {round(time_final-time_initial, 2)} sec")
+        searcher.set_params(scoring="accuracy", cv=5, n_jobs=-1, verbose=1)
 
-    print(f"Best parameters: {gscv.best_params_}")
-    print(
-        f"Best cross-validation score during Grid Search: {round(gscv.best_score_, 6)}"
-    )
+        # Cross-validated search
+        searcher.fit(corpus_, labels_)
+
+        print(f"time taken (search): {round(time.time() - time_initial, 2)} sec")
+        print(f"time taken (refit): {round(searcher.refit_time_, 2)} sec")
+
+        best_params, best_score = searcher.best_params_, searcher.best_score_
+        best_estimator = searcher.best_estimator_
+
+    print(f"Best parameters: {best_params}")
+    print(f"Best cross-validation score during {search} search: {round(best_score, 6)}")
 
     # Score on the entire dataset using the best estimator
-    best_estimator = gscv.best_estimator_
+    time_score = time.time()
     score_on_entire_dataset = best_estimator.score(corpus_, labels_)
     print(f"Score on the entire dataset: {round(score_on_entire_dataset, 6)}")
+    print(f"time taken (scoring): {round(time.time() - time_score, 2)} sec")
 
     # Save model
     dir_path = conf["base_path"] + "models/"
     file_name = "trained_model.pkl"
     save_model(best_estimator, dir_path, file_name)
 
+    print(f"time taken (total): {round(time.time() - time_initial, 2)} sec")
+
     return best_estimator
 
 
+def create_streaming_pipeline() -> Pipeline:
+    """
+    Function to create an untrained pipeline that can be trained in chunks.
+    The hashing vectorizer is stateless, so no vocabulary has to be kept.
+    """
+    # pylint: disable=import-outside-toplevel
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.naive_bayes import MultinomialNB
+    from sklearn.pipeline import Pipeline
+
+    return Pipeline(
+        steps=[
+            (
+                "hashing",
+                HashingVectorizer(
+                    stop_words=english_stopwords(),
+                    ngram_range=conf["streaming_ngram_range"],
+                    n_features=conf["streaming_n_features"],
+                    alternate_sign=False,
+                ),
+            ),
+            ("nb", MultinomialNB(alpha=conf["streaming_alpha"])),
+        ]
+    )
+
+
+def load_streaming_model(dir_path: str, file_name: str) -> Pipeline:
+    """
+    Function to load a saved streaming pipeline in order to update it.
+    """
+    if not os.path.isfile(dir_path + file_name):
+        raise RuntimeError(f"No model to update. ({dir_path + file_name})")
+
+    model = load_model(dir_path, file_name)
+
+    if "hashing" not in model.named_steps:
+        raise RuntimeError(
+            f"Model {dir_path + file_name} was not trained with train_streaming "
+            "and cannot be updated. Train it again with streaming_update False."
+        )
+
+    return model
+
+
+def add_classes(model_nb: MultinomialNB, labels: np.ndarray) -> None:
+    """
+    Function to add classes that are not yet known to a fitted MultinomialNB,
+    so that lines of new artists can be folded in with partial_fit.
+    """
+    new_classes = np.setdiff1d(labels, model_nb.classes_)
+    if len(new_classes) == 0:
+        return
+
+    classes = np.union1d(model_nb.classes_, new_classes)
+
+    # Rows of the known classes in the new, sorted order
+    rows = np.searchsorted(classes, model_nb.classes_)
+
+    class_count = np.zeros(len(classes), dtype=np.float64)
+    class_count[rows] = model_nb.class_count_
+
+    feature_count = np.zeros((len(classes), model_nb.n_features_in_), np.float64)
+    feature_count[rows] = model_nb.feature_count_
+
+    model_nb.classes_ = classes
+    model_nb.class_count_ = class_count
+    model_nb.feature_count_ = feature_count
+
+    print(f"Added new classes: {list(new_classes)}")
+
+
+def train_streaming(
+    chunks: Iterable[tuple[np.ndarray, np.ndarray]], model: Pipeline | None = None
+) -> Pipeline:
+    """
+    Function to train (or update) a streaming pipeline chunk by chunk.
+    Expects an iterable of (lines, labels) tuples.
+    """
+
+    # Make sure necessary NLTK files have been downloaded
+    load_nltk()
+
+    if model is None:
+        model = create_streaming_pipeline()
+
+    vectorizer = model.named_steps["hashing"]
+    model_nb = model.named_steps["nb"]
+
+    time_initial = time.time()
+    count = 0
+
+    for corpus, labels in chunks:
+        with instrument.event("train_chunk", items=len(labels)):
+            features = vectorizer.transform(preprocess_corpus(corpus))
+
+            if hasattr(model_nb, "classes_"):
+                add_classes(model_nb, labels)
+                model_nb.partial_fit(features, labels)
+            else:
+                model_nb.partial_fit(features, labels, classes=np.unique(labels))
+
+        count += len(labels)
+        print(f"Trained on {count} lines ({round(time.time() - time_initial, 2)} sec)")
+
+    return model
+
+
 def save_model(trained_model, dir_path: str, file_name: str) -> None:
     """
     Function to save a model to a file.
     """
+    import joblib  # pylint: disable=import-outside-toplevel
+
     # Use Path to create directories if they don't exist
     Path(dir_path).mkdir(parents=True, exist_ok=True)
 
@@ -162,4 +749,6 @@ def load_model(dir_path: str, file_name: str):
     """
     Function to load a model from a file.
     """
+    import joblib  # pylint: disable=import-outside-toplevel
+
     return joblib.load(dir_path + file_name)
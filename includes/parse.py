@@ -2,14 +2,44 @@
 Helper functions for parsing.
 """
 import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from functools import lru_cache
 from pathlib import Path
 
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-from includes import clean, misc
+from bs4 import BeautifulSoup, FeatureNotFound
+from includes import cache, clean, dedup, htmlstore, instrument, misc
 from settings import conf
 
+# Increase when parse_html changes, so cached parse results are invalidated
+PARSE_VERSION = 1
+
+
+@lru_cache(maxsize=None)
+def get_html_parser() -> str:
+    """
+    Function to get the parser backend for BeautifulSoup.
+    Falls back to the built-in html.parser if the configured one
+    (e.g. lxml) is not installed.
+    """
+    try:
+        BeautifulSoup("", conf["html_parser"])
+    except FeatureNotFound:
+        print(f"Parser {conf['html_parser']} not installed, using html.parser.")
+        return "html.parser"
+
+    return conf["html_parser"]
+
+
+def parse_version() -> str:
+    """
+    Function to get the version of parse results, which also depends on
+    the parser backend, as parsers can build different trees.
+    """
+    return f"{PARSE_VERSION}-{get_html_parser()}"
+
 
 def get_song_urls(artist_urls: dict[str, str]) -> dict[str, list]:
     """
@@ -27,7 +57,7 @@ def get_song_urls(artist_urls: dict[str, str]) -> dict[str, list]:
         ) as file:
             html = file.read()
 
-            soup = BeautifulSoup(html, "html.parser")
+            soup = BeautifulSoup(html, get_html_parser())
 
             parsed_urls = []
 
@@ -39,7 +69,7 @@ def get_song_urls(artist_urls: dict[str, str]) -> dict[str, list]:
                     continue
 
                 # Append to list
-                parsed_urls.append("https://www.lyrics.com" + url)
+                parsed_urls.append(conf["base_url"] + url)
                 count += 1
 
         song_urls[artist] = parsed_urls
@@ -58,7 +88,7 @@ def parse_html(html: str, source: str = "") -> tuple[str, str, str]:
 
     title, artist, lyrics = "", "", ""
 
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, get_html_parser())
 
     # Extract title, artits, and lyrics
     try:
@@ -84,10 +114,26 @@ def get_lyrics_from_file(path_html: str) -> tuple[str, str, str]:
     Function to scrape one single song lyric from html file
     """
 
-    with open(path_html, "r", encoding="utf-8") as file:
-        html = file.read()
+    with instrument.event("parse_file"):
+        with open(path_html, "r", encoding="utf-8") as file:
+            html = file.read()
 
-    title, artist, lyrics = parse_html(html, path_html)
+        title, artist, lyrics = parse_html(html, path_html)
+
+    return title, artist, lyrics
+
+
+def get_lyrics_from_page(
+    page: tuple[str, tuple[str, int, int]],
+) -> tuple[str, str, str]:
+    """
+    Function to scrape one single song lyric from a page of the HTML store,
+    given as (key, location) tuple
+    """
+
+    with instrument.event("parse_file"):
+        key, location = page
+        title, artist, lyrics = parse_html(htmlstore.read_page(location), key)
 
     return title, artist, lyrics
 
@@ -136,29 +182,137 @@ def get_files_to_parse(artists: list[str]) -> dict:
     return all_files
 
 
-def parse_lyrics_from_files(artist_urls: dict[str, str]) -> pd.DataFrame:
+def parse_files(
+    paths: list, n_jobs: int | None = None, parse_func=get_lyrics_from_file
+) -> list[tuple]:
     """
-    Function to parse lyrics from existing files.
+    Function to parse a list of HTML files, in parallel if n_jobs != 1.
+    parse_func parses one item of paths, e.g. get_lyrics_from_page for
+    pages of the HTML store. Returns (title, artist, lyrics) tuples in
+    the order of paths.
     """
+    n_jobs = conf["parse_n_jobs"] if n_jobs is None else n_jobs
+
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
 
-    # Create empty DataFrame
-    songs = pd.DataFrame(columns=["title", "artist", "lyrics"])
+    # Process startup costs more than it saves on few files
+    if n_jobs == 1 or len(paths) < conf["parse_min_parallel"]:
+        return [parse_func(path) for path in paths]
 
-    # Get file names
-    files_to_parse = get_files_to_parse(list(artist_urls.keys()))
+    # Resolve the parser once so that workers don't each print the fallback
+    get_html_parser()
 
-    # Loop through file names and parse HTML
-    for artist, files in files_to_parse.items():
-        for file in files:
-            path_html_file = (
-                conf["base_path"]
-                + conf["scrape_path"]
-                + misc.shorten_artist(artist)
-                + "/"
-                + file
+    # Files parsed by workers are recorded as one batch
+    with instrument.event("parse_batch", items=len(paths)):
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            return list(
+                executor.map(parse_func, paths, chunksize=conf["parse_chunk_size"])
             )
-            title_, artist_, lyrics_ = get_lyrics_from_file(path_html_file)
-            songs.loc[len(songs)] = [title_, artist_, lyrics_]  # type: ignore
+
+
+def parse_files_cached(paths: list[str]) -> list[tuple]:
+    """
+    Function to parse a list of HTML files, re-using cached results
+    of files that did not change since they were last parsed.
+    """
+    connection = cache.open_parse_cache()
+
+    try:
+        results, missing = cache.lookup_parsed(connection, paths, parse_version())
+
+        print(f"Parse cache: {len(results)} files unchanged, {len(missing)} to parse.")
+
+        parsed = parse_files(missing)
+        cache.store_parsed(connection, missing, parsed, parse_version())
+        cache.prune_parsed(connection)
+    finally:
+        connection.close()
+
+    results.update(zip(missing, parsed))
+
+    return [results[path] for path in paths]
+
+
+def parse_pages_cached(pages: list[tuple[str, str, tuple[str, int, int]]]) -> list:
+    """
+    Function to parse pages of the HTML store, given as (key, content hash,
+    location) tuples. Pages with the same content are parsed once, and not
+    at all if their content was parsed before.
+    """
+    locations = {sha256: (key, location) for key, sha256, location in pages}
+
+    connection = cache.open_parse_cache()
+
+    try:
+        results = cache.lookup_parsed_content(
+            connection, list(locations), parse_version()
+        )
+        missing = [sha256 for sha256 in locations if sha256 not in results]
+
+        print(f"Parse cache: {len(results)} pages unchanged, {len(missing)} to parse.")
+
+        parsed = parse_files(
+            [locations[sha256] for sha256 in missing], parse_func=get_lyrics_from_page
+        )
+        cache.store_parsed_content(connection, missing, parsed, parse_version())
+    finally:
+        connection.close()
+
+    results.update(zip(missing, parsed))
+
+    return [results[sha256] for _, sha256, _ in pages]
+
+
+def parse_lyrics_from_store(artists: list[str]) -> list[tuple]:
+    """
+    Function to parse the stored pages of artists. Pages scraped into
+    files before are moved into the store first.
+    """
+    artists_short = [misc.shorten_artist(artist) for artist in artists]
+
+    with closing(htmlstore.open_store()) as store:
+        htmlstore.pack_artists(store, artists_short)
+        pages = htmlstore.get_locations(store, artists_short)
+
+    if conf["parse_cache"]:
+        return parse_pages_cached(pages)
+
+    return parse_files(
+        [(key, location) for key, _, location in pages],
+        parse_func=get_lyrics_from_page,
+    )
+
+
+def parse_lyrics_from_files(artist_urls: dict[str, str]) -> pd.DataFrame:
+    """
+    Function to parse lyrics from existing files, or from the pages in
+    the HTML store if html_store is set.
+    """
+
+    if conf["html_store"]:
+        parsed = parse_lyrics_from_store(list(artist_urls.keys()))
+
+    else:
+        # Get file names
+        files_to_parse = get_files_to_parse(list(artist_urls.keys()))
+
+        paths = [
+            conf["base_path"]
+            + conf["scrape_path"]
+            + misc.shorten_artist(artist)
+            + "/"
+            + file
+            for artist, files in files_to_parse.items()
+            for file in files
+        ]
+
+        parsed = (
+            parse_files_cached(paths) if conf["parse_cache"] else parse_files(paths)
+        )
+
+    # Create the DataFrame once from all results
+    songs = pd.DataFrame(parsed, columns=["title", "artist", "lyrics"])
 
     if songs.shape[0] == 0:
         print("Error: No lyrics found.")
@@ -167,8 +321,25 @@ def parse_lyrics_from_files(artist_urls: dict[str, str]) -> pd.DataFrame:
     # Clean data
     songs_clean = clean.clean_data(songs)
 
-    # Save DataFrame to CSV
     dir_path = conf["base_path"] + "data/"
+
+    # Remove near-duplicate songs (e.g. live and remastered versions)
+    if conf["dedup_songs"]:
+        songs_clean, songs_removed = dedup.drop_duplicates(
+            songs_clean,
+            "lyrics",
+            dedup.word_shingles,
+            conf["dedup_song_threshold"],
+            group="artist",
+        )
+        songs_removed.to_csv(dir_path + "dedup_songs.csv")
+        print(
+            f"Removed {len(songs_removed)} near-duplicate songs in "
+            f"{songs_removed['duplicate_of'].nunique()} clusters "
+            f"(see {dir_path}dedup_songs.csv)"
+        )
+
+    # Save DataFrame to CSV
     file_name_csv_clean = "songs_clean.csv"
     songs_clean.to_csv(dir_path + file_name_csv_clean)
 
@@ -2,93 +2,275 @@
 Helper functions for scraping.
 """
 import os
+import sqlite3
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import lru_cache
+from urllib.parse import urlsplit
 
 import requests
-from includes import misc, parse
+from requests.adapters import HTTPAdapter
+
+from includes import htmlstore, instrument, misc, parse
 from settings import conf
 
+# Response codes that are worth another try
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by all download threads.
+    Allows bursts of up to capacity requests and rate requests per second.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._time_last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Method to block until a token is available and take it.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._time_last) * self.rate
+                )
+                self._time_last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def set_rate(self, rate: float, capacity: float) -> None:
+        """
+        Method to change the rate and the burst capacity.
+        """
+        with self._lock:
+            self.rate = rate
+            self.capacity = capacity
+            self._tokens = min(self._tokens, capacity)
+
+
+@lru_cache(maxsize=None)
+def get_rate_limiter() -> TokenBucket:
+    """
+    Function to get the rate limiter of this process. It is kept for the
+    life of the process, so that downloads started one after another don't
+    get a fresh burst each.
+    """
+    return TokenBucket(conf["scrape_rate"], conf["scrape_burst"])
+
+
+def share_rate(n_processes: int) -> None:
+    """
+    Function to limit this process to its share of scrape_rate and
+    scrape_burst when n_processes processes download at the same time.
+    """
+    get_rate_limiter().set_rate(
+        conf["scrape_rate"] / n_processes, max(1.0, conf["scrape_burst"] / n_processes)
+    )
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """
+    Function to create a requests session with a connection pool.
+    """
+    session = requests.Session()
+    session.headers["User-Agent"] = conf["header"]["user_agent"]
+
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+
+def fetch_url(
+    session: requests.Session,
+    url: str,
+    rate_limiter: TokenBucket,
+    host_limit: threading.Semaphore,
+) -> requests.Response | None:
+    """
+    Function to GET a URL with rate limiting and retries with exponential backoff.
+    """
+    response = None
+
+    for attempt in range(conf["scrape_retries"] + 1):
+        if attempt > 0:
+            time.sleep(conf["scrape_backoff_sec"] * 2 ** (attempt - 1))
+
+        rate_limiter.acquire()
+
+        with host_limit:
+            try:
+                response = session.get(url, allow_redirects=False, timeout=30)
+            except requests.RequestException as error:
+                print(f"Error: {error} for URL {url} (attempt {attempt + 1}).")
+                continue
+
+        if response.status_code not in RETRY_STATUS_CODES:
+            break
+
+    return response
+
+
+def download_files(
+    jobs: list[tuple[str, str]], store: sqlite3.Connection | None = None
+) -> dict[str, int]:
+    """
+    Function to download URLs to files concurrently.
+    Expects a list of (url, file path) tuples, or (url, key) tuples if the
+    pages are written to the HTML store. Existing files (pages) are skipped,
+    so an interrupted crawl can be resumed.
+    """
+    counts = {"written": 0, "skipped": 0, "failed": 0}
+    lock = threading.Lock()
+
+    stored = set()
+    if store is not None:
+        stored = htmlstore.get_keys(store, {path.split("/")[0] for _, path in jobs})
+
+    rate_limiter = get_rate_limiter()
+    host_limits = {
+        host: threading.Semaphore(conf["scrape_per_host"])
+        for host in {urlsplit(url).netloc for url, _ in jobs}
+    }
+
+    def download(url: str, path: str) -> None:
+        # Do nothing if file exists already
+        if path in stored or (store is None and os.path.isfile(path)):
+            result = "skipped"
+        else:
+            with instrument.event("fetch_url"):
+                response = fetch_url(
+                    session, url, rate_limiter, host_limits[urlsplit(url).netloc]
+                )
+
+            if response is not None and response.status_code == 200:
+                if store is not None:
+                    with lock:
+                        htmlstore.put_page(store, path, response.text)
+                else:
+                    # Write to a temporary file first so no partial file is left
+                    with open(path + ".part", "w", encoding="utf-8") as file:
+                        file.write(response.text)
+                    os.replace(path + ".part", path)
+
+                print(f"File {path} written.")
+                result = "written"
+            else:
+                status = "no response" if response is None else response.status_code
+                print(f"Error: Response code {status} for URL {url}.")
+                result = "failed"
 
-def scrape_artist_song_list(artist_urls: dict[str, str]) -> None:
+        with lock:
+            counts[result] += 1
+
+    with create_session(conf["scrape_workers"]) as session:
+        with ThreadPoolExecutor(max_workers=conf["scrape_workers"]) as executor:
+            for future in [executor.submit(download, *job) for job in jobs]:
+                future.result()
+
+    return counts
+
+
+def scrape_artist_song_list(artist_urls: dict[str, str]) -> dict[str, int]:
     """
     Function to scrape song list from a website and save them as files.
+    Returns the number of files written, skipped and failed.
     """
 
-    for artist, url in artist_urls.items():
-        # Create directory for scraped files if it doesn't exist
-        if not os.path.exists(conf["base_path"] + conf["scrape_path"]):
-            os.makedirs(conf["base_path"] + conf["scrape_path"])
+    # Create directory for scraped files if it doesn't exist
+    if not os.path.exists(conf["base_path"] + conf["scrape_path"]):
+        os.makedirs(conf["base_path"] + conf["scrape_path"])
+
+    jobs = []
 
+    for artist, url in artist_urls.items():
         file_name = f"{misc.shorten_artist(artist)}_full_song_list.html"
+        jobs.append((url, conf["base_path"] + conf["scrape_path"] + file_name))
 
-        # Do nothing if file exists already
-        if os.path.isfile(
-            os.path.join(conf["base_path"], conf["scrape_path"], file_name)
-        ):
-            print(f"Skipped existing file {file_name}.")
-            continue
+    counts = download_files(jobs)
 
-        # If file does not exist, fetch it
-        response = requests.get(url, conf["header"], allow_redirects=False, timeout=30)
+    print(
+        f"Song lists: {counts['written']} written, {counts['skipped']} skipped, "
+        f"{counts['failed']} failed."
+    )
 
-        if response.status_code == 200:
-            with open(
-                conf["base_path"] + conf["scrape_path"] + file_name,
-                "w",
-                encoding="utf-8",
-            ) as file:
-                file.write(response.text)
+    return counts
 
-            print(
-                f"Song list for {artist} written to file {conf['scrape_path']}{file_name}"
-            )
 
-        else:
-            print(f"Error: Response code {response.status_code} for URL {url}.")
+def song_key(artist: str, url: str) -> str:
+    """
+    Function to get the key of a song page, its path in the scrape directory.
+    """
+    artist_short = misc.shorten_artist(artist)
 
-        time.sleep(conf["sleep_sec"])
+    return f"{artist_short}/{artist_short}-{url.split('/')[-1]}.html"
+
+
+def song_file_path(artist: str, url: str) -> str:
+    """
+    Function to get the path of the file a song is scraped to.
+    """
+    return conf["base_path"] + conf["scrape_path"] + song_key(artist, url)
 
 
-def scrape_songs_to_files(artist_urls: dict[str, str]) -> None:
+def scrape_songs_to_files(artist_urls: dict[str, str]) -> dict[str, int]:
     """
-    Function to scrape songs and save them locally.
+    Function to scrape songs and save them locally, in the HTML store
+    if html_store is set.
+    Returns the number of files written, skipped and failed.
     """
 
     # Get song URLs
     song_urls = parse.get_song_urls(artist_urls)
 
+    jobs = []
+
     for artist, urls in song_urls.items():
+        if conf["html_store"]:
+            jobs += [(url, song_key(artist, url)) for url in urls]
+            continue
+
         path = (
             conf["base_path"] + conf["scrape_path"] + misc.shorten_artist(artist) + "/"
         )
-        count_skipped = 0
 
         # Create directory for scraped files if it doesn't exist
         if not os.path.exists(path):
             os.makedirs(path)
 
         for url in urls:
-            file_name = f"{misc.shorten_artist(artist)}-{url.split('/')[-1]}.html"
-
-            # Do nothing if file exists already
-            if os.path.isfile(os.path.join(path, file_name)):
-                count_skipped += 1
-                continue
+            jobs.append((url, song_file_path(artist, url)))
 
-            # GET file
-            response = requests.get(
-                url, conf["header"], allow_redirects=False, timeout=30
+    if conf["html_store"]:
+        # One connection shared by the download threads, used under a lock
+        with closing(htmlstore.open_store(check_same_thread=False)) as store:
+            # Pages scraped before are not downloaded again
+            htmlstore.pack_artists(
+                store, [misc.shorten_artist(artist) for artist in song_urls]
             )
+            counts = download_files(jobs, store)
+    else:
+        counts = download_files(jobs)
 
-            if response.status_code == 200:
-                with open(path + file_name, "w", encoding="utf-8") as file:
-                    file.write(response.text)
-
-                print(f"File {path + file_name} for {artist} written to file.")
-
-            else:
-                print(f"Error: Response code {response.status_code} for URL {url}.")
-
-            time.sleep(conf["sleep_sec"])
+    print(
+        f"Songs: {counts['written']} written, {counts['skipped']} skipped "
+        f"(existing files), {counts['failed']} failed."
+    )
 
-        print(f"Skipped {count_skipped} existing files for artist {artist}.")
+    return counts
@@ -0,0 +1,287 @@
+"""
+Helper functions and classes for the HTTP inference server.
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from includes import inference
+
+
+class ServingStats:
+    """
+    Class to collect latency and throughput counters of the server.
+    """
+
+    def __init__(self, window: int = 10000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._time_start = time.perf_counter()
+        self.count_requests = 0
+        self.count_lines = 0
+        self.count_batches = 0
+        self.count_errors = 0
+
+    def add_request(self, latency: float, lines: int) -> None:
+        """
+        Method to record a finished request.
+        """
+        with self._lock:
+            self._latencies.append(latency)
+            self.count_requests += 1
+            self.count_lines += lines
+
+    def add_batch(self) -> None:
+        """
+        Method to record a processed micro-batch.
+        """
+        with self._lock:
+            self.count_batches += 1
+
+    def add_error(self) -> None:
+        """
+        Method to record a failed request.
+        """
+        with self._lock:
+            self.count_errors += 1
+
+    def summary(self) -> dict:
+        """
+        Method to return all counters as a dictionary.
+        """
+        with self._lock:
+            latencies = np.array(self._latencies)
+            uptime = time.perf_counter() - self._time_start
+
+            summary = {
+                "uptime_sec": round(uptime, 3),
+                "requests": self.count_requests,
+                "lines": self.count_lines,
+                "batches": self.count_batches,
+                "errors": self.count_errors,
+                "lines_per_batch": round(
+                    self.count_lines / max(self.count_batches, 1), 3
+                ),
+                "requests_per_sec": round(self.count_requests / uptime, 3),
+                "lines_per_sec": round(self.count_lines / uptime, 3),
+                "latency_ms_p50": None,
+                "latency_ms_p99": None,
+            }
+
+        if len(latencies) > 0:
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+            summary["latency_ms_p50"] = round(float(p50), 3)
+            summary["latency_ms_p99"] = round(float(p99), 3)
+
+        return summary
+
+
+class _PendingRequest:
+    """
+    Lines of one request waiting to be processed in a micro-batch.
+    """
+
+    def __init__(self, lines: list[str]):
+        self.lines = lines
+        self.done = threading.Event()
+        self.predictions = None
+        self.probabilities = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Class to combine concurrent prediction requests into micro-batches.
+
+    A batch is processed as soon as it holds max_batch_size lines or
+    max_wait_ms have passed since its first request arrived.
+    """
+
+    def __init__(self, model, max_batch_size: int = 256, max_wait_ms: float = 10):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats = ServingStats()
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def predict(self, lines: list[str]) -> tuple[list[str], list[float]]:
+        """
+        Method to queue lines for prediction and wait for the result.
+        """
+        time_initial = time.perf_counter()
+
+        request = _PendingRequest(lines)
+        self._queue.put(request)
+        request.done.wait()
+
+        if request.error is not None:
+            self.stats.add_error()
+            raise request.error
+
+        self.stats.add_request(time.perf_counter() - time_initial, len(lines))
+
+        return request.predictions, request.probabilities
+
+    def close(self) -> None:
+        """
+        Method to stop the batching thread after the queued requests are done.
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect_batch(self) -> tuple[list[_PendingRequest], bool]:
+        """
+        Method to wait for the next batch of requests.
+        """
+        first = self._queue.get()
+        if first is None:
+            return [], True
+
+        batch = [first]
+        count_lines = len(first.lines)
+        deadline = time.perf_counter() + self.max_wait
+
+        while count_lines < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            if request is None:
+                return batch, True
+
+            batch.append(request)
+            count_lines += len(request.lines)
+
+        return batch, False
+
+    def _run(self) -> None:
+        """
+        Method to process micro-batches until close() is called.
+        """
+        stop = False
+
+        while not stop:
+            batch, stop = self._collect_batch()
+            if not batch:
+                continue
+
+            lines = [line for request in batch for line in request.lines]
+
+            try:
+                predictions, probabilities = inference.predict_lines(self.model, lines)
+            except Exception as error:  # pylint: disable=broad-except
+                for request in batch:
+                    request.error = error
+                    request.done.set()
+                continue
+
+            self.stats.add_batch()
+
+            start = 0
+            for request in batch:
+                end = start + len(request.lines)
+                request.predictions = [str(p) for p in predictions[start:end]]
+                request.probabilities = [float(p) for p in probabilities[start:end]]
+                request.done.set()
+                start = end
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """
+    Request handler answering prediction and metrics requests.
+
+    POST /predict with {"lines": [...]} or {"line": "..."}
+    GET /metrics returns latency and throughput counters
+    GET /health returns {"status": "ok"}
+    """
+
+    server: "PredictionServer"
+
+    def _send_json(self, status: int, data: dict) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        Method to answer GET requests.
+        """
+        if self.path == "/metrics":
+            self._send_json(200, self.server.batcher.stats.summary())
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        Method to answer POST requests.
+        """
+        if self.path != "/predict":
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"{}")
+            lines = data["lines"] if "lines" in data else [data["line"]]
+            if not isinstance(lines, list):
+                raise ValueError("lines has to be a list of strings.")
+            if not all(isinstance(line, str) for line in lines):
+                raise ValueError("All lines have to be strings.")
+        except (ValueError, KeyError, TypeError) as error:
+            self._send_json(400, {"error": f"Invalid request: {error}"})
+            return
+
+        if not lines:
+            self._send_json(200, {"results": []})
+            return
+
+        try:
+            predictions, probabilities = self.server.batcher.predict(lines)
+        except Exception as error:  # pylint: disable=broad-except
+            self._send_json(500, {"error": str(error)})
+            return
+
+        results = [
+            {"line": line, "artist": pred, "probability": prob}
+            for line, pred, prob in zip(lines, predictions, probabilities)
+        ]
+        self._send_json(200, {"results": results})
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class PredictionServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server holding the model and the micro-batcher.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(
+        self, address: tuple[str, int], batcher: MicroBatcher, verbose: bool = False
+    ):
+        self.batcher = batcher
+        self.verbose = verbose
+        super().__init__(address, PredictionHandler)
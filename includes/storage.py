@@ -0,0 +1,101 @@
+"""
+Helper functions for storing the line corpus.
+"""
+
+import os
+from typing import Iterator
+
+import pandas as pd
+
+from settings import conf
+
+
+def parquet_available() -> bool:
+    """
+    Function to check if pyarrow is installed to read and write Parquet.
+    """
+    try:
+        import pyarrow  # pylint: disable=import-outside-toplevel,unused-import
+    except ImportError:
+        return False
+
+    return True
+
+
+def save_corpus(df_: pd.DataFrame, file_name: str = "songs_by_line") -> str | None:
+    """
+    Function to save the line corpus as Parquet file
+    with categorical artist and title columns.
+    """
+    if not parquet_available():
+        print("Skip saving Parquet corpus (pyarrow not installed).")
+        return None
+
+    dir_name = conf["base_path"] + "data/"
+    df_ = df_.astype({"artist": "category", "title": "category"})
+    df_.to_parquet(dir_name + file_name + ".parquet", engine="pyarrow")
+    print(f"Saved lyrics by line to {dir_name + file_name}.parquet")
+
+    return dir_name + file_name + ".parquet"
+
+
+def corpus_file(file_name: str = "songs_by_line") -> str:
+    """
+    Function to get the path of the file a corpus is read from: the Parquet
+    file if it is present and pyarrow is installed, otherwise the CSV file.
+    """
+    dir_name = conf["base_path"] + "data/"
+
+    if os.path.isfile(dir_name + file_name + ".parquet") and parquet_available():
+        return dir_name + file_name + ".parquet"
+
+    return dir_name + file_name + ".csv"
+
+
+def load_corpus(
+    file_name: str = "songs_by_line", memory_map: bool | None = None
+) -> pd.DataFrame | None:
+    """
+    Function to load the line corpus, from the Parquet file if it is present
+    and pyarrow is installed, otherwise from the CSV file.
+    """
+    dir_name = conf["base_path"] + "data/"
+    memory_map = conf["corpus_memory_map"] if memory_map is None else memory_map
+
+    if os.path.isfile(dir_name + file_name + ".parquet") and parquet_available():
+        # pylint: disable-next=import-outside-toplevel
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(dir_name + file_name + ".parquet", memory_map=memory_map)
+
+        return table.to_pandas()
+
+    if os.path.isfile(dir_name + file_name + ".csv"):
+        return pd.read_csv(dir_name + file_name + ".csv", index_col=0)
+
+    return None
+
+
+def iter_corpus(
+    chunk_size: int, file_name: str = "songs_by_line"
+) -> Iterator[pd.DataFrame]:
+    """
+    Function to read artist and lyrics of the line corpus in chunks of
+    chunk_size rows without loading the whole file into memory.
+    """
+    dir_name = conf["base_path"] + "data/"
+    columns = ["artist", "lyrics"]
+
+    if os.path.isfile(dir_name + file_name + ".parquet") and parquet_available():
+        # pylint: disable-next=import-outside-toplevel
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(dir_name + file_name + ".parquet")
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas().dropna()
+
+    elif os.path.isfile(dir_name + file_name + ".csv"):
+        for df_chunk in pd.read_csv(
+            dir_name + file_name + ".csv", usecols=columns, chunksize=chunk_size
+        ):
+            yield df_chunk.dropna()
@@ -0,0 +1,206 @@
+"""
+Helper functions to run the project as a pipeline of stages.
+
+Every stage declares the files and directories it reads and writes.
+Stages depend on the stages writing their inputs and are only run again
+when the content of their inputs (or their settings) changed since their
+last run. Stages that don't depend on each other run concurrently,
+unless only one worker is allowed or a profiler is active.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from includes import cache, instrument
+from settings import conf
+
+
+class Stage:
+    """
+    Step of the pipeline. func is called without arguments and may return
+    the number of processed items. params are settings that change the
+    outputs, so that changing them runs the stage again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func,
+        inputs: list[str],
+        outputs: list[str],
+        params: dict | None = None,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.params = params or {}
+        self.enabled = enabled
+
+
+def load_state(file_name: str) -> dict[str, str]:
+    """
+    Function to load the input hashes of the stages' last runs.
+    """
+    if not os.path.isfile(file_name):
+        return {}
+
+    with open(file_name, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_state(state: dict[str, str], file_name: str) -> None:
+    """
+    Function to save the input hashes of the stages' last runs.
+    """
+    Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+
+    with open(file_name + ".part", "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=2)
+    os.replace(file_name + ".part", file_name)
+
+
+def stage_key(stage: Stage) -> str | None:
+    """
+    Function to hash the content of a stage's inputs and its settings.
+    Returns None if an input does not exist.
+    """
+    inputs_hash = cache.paths_hash(stage.inputs)
+    if inputs_hash is None:
+        return None
+
+    key = json.dumps(
+        {"inputs": inputs_hash, "params": stage.params}, sort_keys=True, default=str
+    )
+
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def get_dependencies(stages: list[Stage]) -> dict[str, set[str]]:
+    """
+    Function to get the names of the stages writing each stage's inputs.
+    """
+    return {
+        stage.name: {
+            other.name
+            for other in stages
+            if other is not stage and set(other.outputs) & set(stage.inputs)
+        }
+        for stage in stages
+    }
+
+
+def missing_input_message(stage: Stage, stages: list[Stage]) -> str:
+    """
+    Function to describe the missing inputs of a stage and the disabled
+    stages that would create them.
+    """
+    missing = [path for path in stage.inputs if not os.path.exists(path)]
+    disabled = [
+        other.name
+        for other in stages
+        if not other.enabled and set(other.outputs) & set(missing)
+    ]
+
+    message = f"Input {', '.join(missing)} of stage {stage.name} not found."
+    if disabled:
+        message += f" It is created by the disabled stage {', '.join(disabled)}."
+
+    return message
+
+
+def run_pipeline(
+    stages: list[Stage],
+    force: list[str] | None = None,
+    max_workers: int | None = None,
+    state_file: str | None = None,
+) -> dict[str, str]:
+    """
+    Function to run the stages in dependency order, skipping stages whose
+    inputs did not change since their last run (unless they are in force).
+    Returns the status of every stage: "ran", "up to date" or "disabled".
+    Raises FileNotFoundError if an input of an enabled stage is missing.
+    """
+    force = conf["pipeline_force"] if force is None else force
+    max_workers = conf["pipeline_workers"] if max_workers is None else max_workers
+    if state_file is None:
+        state_file = conf["base_path"] + conf["pipeline_state_file"]
+
+    dependencies = get_dependencies(stages)
+    state = load_state(state_file)
+    lock = threading.Lock()
+
+    def run_stage(stage: Stage) -> str:
+        if not stage.enabled:
+            print(f"Skip stage {stage.name} (disabled in settings)")
+            return "disabled"
+
+        key = stage_key(stage)
+        if key is None:
+            raise FileNotFoundError(missing_input_message(stage, stages))
+
+        if (
+            stage.name not in force
+            and state.get(stage.name) == key
+            and all(os.path.exists(path) for path in stage.outputs)
+        ):
+            print(f"Skip stage {stage.name} (up to date)")
+            return "up to date"
+
+        print(f"Run stage {stage.name}")
+        with instrument.stage(stage.name) as record:
+            record["items"] = stage.func()
+
+        # Save after every stage, so that an interrupted run resumes here
+        with lock:
+            state[stage.name] = key
+            save_state(state, state_file)
+
+        return "ran"
+
+    status = {}
+    running = {}
+
+    # Profilers only record the thread they were started in
+    if conf["profile"] and max_workers != 1:
+        print("Run stages one at a time, so that the profiler records them")
+        max_workers = 1
+
+    if max_workers == 1:
+        while len(status) < len(stages):
+            ready = [
+                stage
+                for stage in stages
+                if stage.name not in status
+                and dependencies[stage.name] <= status.keys()
+            ]
+            if not ready:
+                raise RuntimeError("Stages depend on each other in a cycle.")
+            for stage in ready:
+                status[stage.name] = run_stage(stage)
+
+        return status
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while len(status) < len(stages):
+            for stage in stages:
+                if (
+                    stage.name not in status
+                    and stage.name not in running.values()
+                    and dependencies[stage.name] <= status.keys()
+                ):
+                    running[executor.submit(run_stage, stage)] = stage.name
+
+            if not running:
+                raise RuntimeError("Stages depend on each other in a cycle.")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                status[running.pop(future)] = future.result()
+
+    return status
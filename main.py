@@ -2,83 +2,354 @@
 A Python Script to predict the artist of a song line
 """
 
+import argparse
 import os
 import sys
 
 import pandas as pd
 
-from includes import misc, modelling, parse, scrape
+from includes import (
+    artifact,
+    cache,
+    catalogue,
+    htmlstore,
+    instrument,
+    misc,
+    modelling,
+    parse,
+    scrape,
+    storage,
+    workflow,
+)
 from settings import conf
 
 
-def main():
+def parse_args() -> argparse.Namespace:
     """
-    Main function
+    Function to parse the command line arguments.
     """
-    if conf["scrape_song_list"]:
-        print("Scraping HTML files containing URLs to song lyrics")
-        scrape.scrape_artist_song_list(conf["artist_urls"])
-    else:
-        print("Skip scraping HTML files containing URLs to song lyrics")
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        "--force",
+        nargs="+",
+        default=conf["pipeline_force"],
+        metavar="STAGE",
+        help="Run these stages even if their inputs did not change.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=conf["pipeline_workers"],
+        help="Maximum number of stages to run at the same time.",
+    )
 
-    if conf["scrape_songs"]:
-        print("Scraping lyric files from URLs")
-        scrape.scrape_songs_to_files(conf["artist_urls"])
-    else:
-        print("Skip scraping lyric files from URLs")
-
-    if conf["parse_html"]:
-        print("Parsing lyrics from file and save them in a CSV file")
-        songs = parse.parse_lyrics_from_files(conf["artist_urls"])
-
-        if isinstance(songs, pd.DataFrame):
-            print("Converting lyrics to lines")
-            misc.convert_lyrics_to_lines(songs)
-        else:
-            print("Error: Parsing result has no data.")
-            sys.exit(1)
-    else:
-        print("Skip parsing lyrics from file and save them in a CSV file")
+    return parser.parse_args()
 
-    file_songs_by_line = conf["base_path"] + "data/" + "songs_by_line.csv"
-    if os.path.isfile(file_songs_by_line):
-        print("Importing CSV file with lyrics")
-        df_corpus = pd.read_csv(file_songs_by_line, index_col=0)
-    else:
-        print(f"Error: File not found. ({file_songs_by_line})")
-        sys.exit(1)
 
-    if conf["create_wordclouds"]:
-        print("Creating wordclouds")
-        corpus = " ".join(df_corpus[df_corpus["artist"] == "Eels"]["lyrics"])
-        misc.plot_wordcloud(corpus, name="Eels", shape="circle")
+def scrape_song_list() -> int:
+    """
+    Stage to scrape the HTML files containing URLs to song lyrics.
+    """
+    counts = scrape.scrape_artist_song_list(catalogue.get_artist_urls())
+
+    return sum(counts.values())
+
+
+def scrape_songs() -> int:
+    """
+    Stage to scrape the lyric files from the song URLs.
+    """
+    counts = scrape.scrape_songs_to_files(catalogue.get_artist_urls())
+
+    return sum(counts.values())
+
+
+def parse_html() -> int:
+    """
+    Stage to parse the lyrics from the HTML files and save them in a CSV file.
+    """
+    songs = parse.parse_lyrics_from_files(catalogue.get_artist_urls())
+
+    if not isinstance(songs, pd.DataFrame):
+        raise RuntimeError("Parsing result has no data.")
+
+    return len(songs)
 
-        corpus = " ".join(
-            df_corpus[df_corpus["artist"] == "Rage Against the Machine"]["lyrics"]
+
+def convert_lyrics_to_lines() -> int:
+    """
+    Stage to split the parsed lyrics into lines.
+    """
+    songs = pd.read_csv(conf["base_path"] + "data/songs_clean.csv", index_col=0)
+
+    return len(misc.convert_lyrics_to_lines(songs))
+
+
+def load_corpus() -> pd.DataFrame:
+    """
+    Function to load the lyrics by line.
+    """
+    df_corpus = storage.load_corpus()
+
+    if df_corpus is None:
+        raise RuntimeError(
+            f"File not found. ({conf['base_path']}data/songs_by_line.csv)"
         )
-        misc.plot_wordcloud(corpus, name="ratm", shape="text")
 
-        corpus = " ".join(df_corpus[df_corpus["artist"] == "Adele"]["lyrics"])
-        misc.plot_wordcloud(corpus, name="Adele", shape="circle")
-    else:
-        print("Skip creating wordclouds")
+    return df_corpus
+
+
+def create_wordclouds() -> int:
+    """
+    Stage to create the wordclouds of the artists.
+    """
+    df_corpus = load_corpus()
+
+    corpus = " ".join(df_corpus[df_corpus["artist"] == "Eels"]["lyrics"])
+    misc.plot_wordcloud(corpus, name="Eels", shape="circle")
+
+    corpus = " ".join(
+        df_corpus[df_corpus["artist"] == "Rage Against the Machine"]["lyrics"]
+    )
+    misc.plot_wordcloud(corpus, name="ratm", shape="text")
+
+    corpus = " ".join(df_corpus[df_corpus["artist"] == "Adele"]["lyrics"])
+    misc.plot_wordcloud(corpus, name="Adele", shape="circle")
+
+    return 3
+
+
+def train_model_streaming() -> int:
+    """
+    Function to train the streaming model chunk by chunk on the corpus or,
+    with streaming_update, to fold only the lines of the update file into
+    the saved model.
+    """
+    model_path = conf["base_path"] + "models/"
+    file_name = "songs_by_line"
+    model, update_hash = None, None
+
+    if conf["streaming_update"]:
+        file_name = conf["streaming_update_file"]
+        model = modelling.load_streaming_model(model_path, "trained_model.pkl")
+
+        # Lines of an update file are only counted once
+        update_hash = cache.file_hash(storage.corpus_file(file_name))
+        if update_hash in getattr(model, "folded_updates_", []):
+            print(f"Update {storage.corpus_file(file_name)} is already in the model")
+            return 0
+
+        print(f"Update existing model with {storage.corpus_file(file_name)}")
+
+    chunks = (
+        (df_chunk["lyrics"].to_numpy(), df_chunk["artist"].to_numpy())
+        for df_chunk in storage.iter_corpus(conf["streaming_chunk_size"], file_name)
+    )
+    model = modelling.train_streaming(chunks, model)
+
+    if update_hash is not None:
+        model.folded_updates_ = getattr(model, "folded_updates_", []) + [update_hash]
+
+    modelling.save_model(model, model_path, "trained_model.pkl")
+
+    # Streaming models cannot be exported, don't leave an older model behind
+    artifact.remove_artifact()
+
+    if conf["lemma_table"]:
+        print("Build lemma table for inference")
+        lines = (
+            line
+            for df_chunk in storage.iter_corpus(conf["streaming_chunk_size"], file_name)
+            for line in df_chunk["lyrics"]
+        )
+        table = modelling.build_lemma_table(lines, modelling.common_words())
+
+        # Keep the tokens of the lines folded in before
+        if conf["streaming_update"] and modelling.load_lemma_table():
+            table = {**modelling.LEMMA_TABLE, **table}
+        modelling.save_lemma_table(table)
 
-    if conf["train_model"]:
-        print("Train model")
-        print("Prepare corpus and labels")
-        corpus, labels = modelling.prepare_corpus(df_corpus)
+    return instrument.EVENTS.get("train_chunk", {}).get("items")
 
-        print("Preprocess data")
-        corpus_clean = modelling.preprocess_corpus(corpus)
-        assert len(corpus_clean) == len(corpus_clean)
 
-        # Tune hyperparameters and save fitted model to file
-        modelling.tune_hyperparameters(corpus_clean, labels)
+def train_model() -> int:
+    """
+    Stage to train the model, on chunks of the corpus if train_streaming
+    is set, otherwise by tuning its hyperparameters on the whole corpus.
+    """
+    if conf["train_streaming"]:
+        return train_model_streaming()
+
+    # Artists as int32 codes, if the lines are encoded as token ids for training
+    if conf["train_encoded"]:
+        corpus, labels, classes = modelling.prepare_corpus_encoded(load_corpus())
     else:
-        print("Skip training model")
+        corpus, labels = modelling.prepare_corpus(load_corpus())
+        classes = None
+
+    # Tokenize and lemmatize, or load the result of an earlier run
+    corpus_clean = modelling.preprocess_corpus_cached(corpus)
+
+    for name, info in modelling.preprocess_cache_info().items():
+        print(f"Cache {name}: {info['hits']} hits, {info['misses']} misses")
+
+    # Tune hyperparameters and save fitted model to file
+    model = modelling.tune_hyperparameters(corpus_clean, labels, classes_=classes)
+
+    if conf["export_artifact"]:
+        dir_path = artifact.export_model(
+            model, model_file=conf["base_path"] + "models/trained_model.pkl"
+        )
+        print(f"Model exported to {dir_path} for inference")
+
+    if conf["lemma_table"]:
+        print("Build lemma table for inference")
+        modelling.save_lemma_table(
+            modelling.build_lemma_table(corpus, modelling.common_words())
+        )
+
+    return len(corpus_clean)
+
+
+def create_stages() -> list[workflow.Stage]:
+    """
+    Function to define the stages of the project with their inputs and outputs.
+    """
+    scrape_path = conf["base_path"] + conf["scrape_path"]
+    data_path = conf["base_path"] + "data/"
+    model_path = conf["base_path"] + "models/"
+    artist_urls = catalogue.get_artist_urls()
+
+    song_lists = [
+        f"{scrape_path}{misc.shorten_artist(artist)}_full_song_list.html"
+        for artist in artist_urls
+    ]
+    song_dirs = [
+        f"{scrape_path}{misc.shorten_artist(artist)}/" for artist in artist_urls
+    ]
+
+    # The index of the HTML store changes whenever a page is added. Song
+    # directories scraped before are read until they are packed into it.
+    if conf["html_store"]:
+        song_dirs = [path for path in song_dirs if os.path.isdir(path)]
+        if os.path.isfile(htmlstore.index_file()) or not song_dirs:
+            song_dirs.append(htmlstore.index_file())
+
+    # An update of the streaming model only reads the update file
+    train_inputs = [data_path + "songs_by_line.csv"]
+    if conf["train_streaming"] and conf["streaming_update"]:
+        train_inputs = [storage.corpus_file(conf["streaming_update_file"])]
+
+    return [
+        workflow.Stage(
+            "scrape_song_list",
+            scrape_song_list,
+            inputs=[],
+            outputs=song_lists,
+            params={"artist_urls": artist_urls},
+            enabled=conf["scrape_song_list"],
+        ),
+        workflow.Stage(
+            "scrape_songs",
+            scrape_songs,
+            inputs=song_lists,
+            outputs=song_dirs,
+            enabled=conf["scrape_songs"],
+        ),
+        workflow.Stage(
+            "parse_html",
+            parse_html,
+            inputs=song_dirs,
+            outputs=[data_path + "songs_clean.csv"],
+            params={
+                "artists": list(artist_urls),
+                "version": parse.parse_version(),
+                "html_store": conf["html_store"],
+                "dedup_songs": conf["dedup_songs"],
+                "dedup_song_threshold": conf["dedup_song_threshold"],
+                "dedup_num_perm": conf["dedup_num_perm"],
+            },
+            enabled=conf["parse_html"],
+        ),
+        workflow.Stage(
+            "convert_lyrics_to_lines",
+            convert_lyrics_to_lines,
+            inputs=[data_path + "songs_clean.csv"],
+            outputs=[data_path + "songs_by_line.csv"],
+            params={
+                key: conf[key]
+                for key in ["dedup_lines", "dedup_line_threshold", "dedup_num_perm"]
+            },
+            enabled=conf["parse_html"],
+        ),
+        workflow.Stage(
+            "create_wordclouds",
+            create_wordclouds,
+            inputs=[data_path + "songs_by_line.csv"],
+            outputs=[
+                conf["base_path"] + "wordclouds/wordcloud-Eels-circle.png",
+                conf["base_path"] + "wordclouds/wordcloud-ratm-text.png",
+                conf["base_path"] + "wordclouds/wordcloud-Adele-circle.png",
+            ],
+            enabled=conf["create_wordclouds"],
+        ),
+        workflow.Stage(
+            "train_model",
+            train_model,
+            inputs=train_inputs,
+            outputs=[model_path + "trained_model.pkl"],
+            params={
+                "preprocess_version": modelling.PREPROCESS_VERSION,
+                **{
+                    key: conf[key]
+                    for key in [
+                        "search",
+                        "search_n_iter",
+                        "train_encoded",
+                        "train_streaming",
+                        "streaming_update",
+                        "streaming_update_file",
+                        "streaming_ngram_range",
+                        "streaming_n_features",
+                        "streaming_alpha",
+                        "export_artifact",
+                        "lemma_table",
+                    ]
+                },
+            },
+            enabled=conf["train_model"],
+        ),
+    ]
+
+
+def main():
+    """
+    Main function
+    """
+    args = parse_args()
+
+    try:
+        # Fail before scraping and parsing if training can't get the NLTK data
+        if conf["train_model"]:
+            misc.bootstrap_nltk_data()
+
+        status = workflow.run_pipeline(
+            create_stages(), force=args.force, max_workers=args.workers
+        )
+    except (FileNotFoundError, LookupError, RuntimeError) as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+
+    print()
+    for name, result in status.items():
+        print(f"{name:<28}{result}")
+
+    if conf["metrics"]:
+        instrument.print_summary()
+        instrument.save_metrics()
 
     print("Done. Run predict.py to predict the artist of a song line.")
 
 
 if __name__ == "__main__":
-    main()
+    instrument.run_profiled(main)
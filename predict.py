@@ -1,26 +1,98 @@
 """
 Python script to predict the artist of a song based on its lyrics.
+
+Run without arguments for interactive mode, or with --batch to classify
+every line read from a file or stdin:
+
+    python predict.py --batch --input lines.txt --output results.jsonl
 """
 
+import argparse
+import sys
+
 import joblib
 
-from includes import misc, modelling
+from includes import artifact, engine, inference, misc, modelling
 from settings import conf
 
 
-def main():
+def parse_args() -> argparse.Namespace:
     """
-    Main function
+    Function to parse the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Classify all lines from --input instead of asking interactively.",
+    )
+    parser.add_argument(
+        "--input", default="-", help="File with one line per row (default: stdin)."
+    )
+    parser.add_argument(
+        "--output", default="-", help="File to write results to (default: stdout)."
+    )
+    parser.add_argument(
+        "--format",
+        choices=["jsonl", "csv"],
+        default="jsonl",
+        help="Output format (default: jsonl).",
+    )
+    parser.add_argument(
+        "--artifact",
+        action="store_true",
+        help="Use the exported, memory-mapped model (exported again when outdated).",
+    )
+    parser.add_argument(
+        "--engine",
+        action="store_true",
+        help="Predict with the compact NumPy inference engine.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=conf["predict_chunk_size"],
+        help="Number of lines to preprocess and predict at once.",
+    )
+
+    return parser.parse_args()
+
+
+def run_batch(model, args: argparse.Namespace) -> None:
     """
+    Function to classify all lines from the input file in chunks.
+    """
+    input_file = (
+        sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    )
+    output_file = (
+        sys.stdout
+        if args.output == "-"
+        else open(args.output, "w", encoding="utf-8", newline="")
+    )
+
+    try:
+        count = inference.predict_batch(
+            model,
+            input_file,
+            output_file,
+            chunk_size=args.chunk_size,
+            output_format=args.format,
+        )
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
 
-    keep_asking = True
+    print(f"Classified {count} lines.", file=sys.stderr)
 
-    # Load model
-    file_name = "trained_model.pkl"
-    model = joblib.load(conf["base_path"] + "models/" + file_name)
 
-    misc.download_nltk_data("wordnet")
-    misc.download_nltk_data("stopwords")
+def run_interactive(model) -> None:
+    """
+    Function to ask for song lines and predict their artist one by one.
+    """
+    keep_asking = True
 
     while keep_asking:
         print(
@@ -37,17 +109,58 @@ def main():
 
         lyrics = [user_input]
 
-        # Preprocess
-        lyrics_clean = modelling.preprocess_corpus(lyrics)
-
         # Get results
-        predictions = model.predict(lyrics_clean)
-        probabilities = [p.max() for p in model.predict_proba(lyrics_clean)]
+        predictions, probabilities = inference.predict_lines(model, lyrics)
 
         # Print results
         modelling.print_results(lyrics, predictions, probabilities)
         print("\n")
 
 
+def main():
+    """
+    Main function
+    """
+    args = parse_args()
+
+    # Load model
+    model_file = conf["base_path"] + "models/trained_model.pkl"
+    try:
+        if args.artifact:
+            # Export again if the model was trained after the last export
+            if not artifact.is_current(model_file):
+                dir_path = artifact.export_model(
+                    joblib.load(model_file), model_file=model_file
+                )
+                print(f"Model exported to {dir_path}", file=sys.stderr)
+            model = artifact.load_artifact()
+        else:
+            model = joblib.load(model_file)
+
+        if args.engine and not args.artifact:
+            model = engine.InferenceEngine.from_pipeline(model)
+    except ValueError as error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
+
+    # With a lemma table, WordNet is only loaded for unknown tokens
+    n_lemmas = modelling.load_lemma_table()
+    if n_lemmas:
+        print(f"Lemma table loaded with {n_lemmas} tokens", file=sys.stderr)
+
+    # Load WordNet and the stopwords before the first line is lemmatized
+    try:
+        sec = misc.warm_up_nltk(wordnet=n_lemmas == 0)
+    except LookupError as error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
+    print(f"NLTK data loaded in {round(sec, 2)} sec", file=sys.stderr)
+
+    if args.batch:
+        run_batch(model, args)
+    else:
+        run_interactive(model)
+
+
 if __name__ == "__main__":
     main()
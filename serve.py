@@ -0,0 +1,105 @@
+"""
+Python script to serve artist predictions over HTTP.
+
+The model and the NLTK data are loaded once. Concurrent requests are
+combined into micro-batches before they are preprocessed and predicted.
+
+    curl -X POST localhost:8000/predict -d '{"lines": ["I set fire to the rain"]}'
+    curl localhost:8000/metrics
+"""
+
+import argparse
+import sys
+import time
+
+import joblib
+
+from includes import engine, misc, modelling, serving
+from settings import conf
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Function to parse the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--host", default=conf["serve_host"])
+    parser.add_argument("--port", type=int, default=conf["serve_port"])
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=conf["serve_max_batch_size"],
+        help="Maximum number of lines per micro-batch.",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=conf["serve_max_wait_ms"],
+        help="Maximum time to wait for more requests before a batch is run.",
+    )
+    parser.add_argument(
+        "--engine",
+        action="store_true",
+        help="Predict with the compact NumPy inference engine.",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+
+    return parser.parse_args()
+
+
+def main():
+    """
+    Main function
+    """
+    args = parse_args()
+
+    time_initial = time.time()
+
+    # Load model
+    file_name = "trained_model.pkl"
+    model = joblib.load(conf["base_path"] + "models/" + file_name)
+    if args.engine:
+        try:
+            model = engine.InferenceEngine.from_pipeline(model)
+        except ValueError as error:
+            print(f"Error: {error}")
+            sys.exit(1)
+
+    # With a lemma table, WordNet is only loaded for unknown tokens
+    n_lemmas = modelling.load_lemma_table()
+    if n_lemmas:
+        print(f"Lemma table loaded with {n_lemmas} tokens")
+
+    # Load WordNet and the stopwords before the first request
+    try:
+        sec = misc.warm_up_nltk(wordnet=n_lemmas == 0)
+    except LookupError as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+    print(f"NLTK data loaded in {round(sec, 2)} sec")
+
+    batcher = serving.MicroBatcher(
+        model, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms
+    )
+
+    # Run one prediction so that the model is warmed up before the first request
+    batcher.predict(["warm up"])
+
+    print(f"Model loaded in {round(time.time() - time_initial, 2)} sec")
+
+    server = serving.PredictionServer(
+        (args.host, args.port), batcher, verbose=args.verbose
+    )
+    print(f"Serving predictions on http://{args.host}:{args.port}/predict")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == "__main__":
+    main()
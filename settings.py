@@ -7,15 +7,101 @@ import os
 
 conf = {
     "scrape_path": "scrape/",
+    # Stages of main.py to run
     "scrape_song_list": False,
     "scrape_songs": False,
-    "parse_html": False,
+    "parse_html": True,
     "create_wordclouds": False,
     "train_model": True,
-    "sleep_sec": 10,
+    # Input hashes of the last runs, stages run at the same time (1: in order)
+    "pipeline_state_file": "data/pipeline_state.json",
+    "pipeline_force": [],
+    "pipeline_workers": 2,
+    # Stage metrics, and "cprofile" or "pyinstrument" to profile main.py
+    "metrics": True,
+    "metrics_file": "data/metrics.jsonl",
+    "profile": None,
+    "profile_path": "data/profile/",
+    # CSV or JSONL file with artist, url (and slug) columns, None for artist_urls
+    "artist_manifest": None,
+    # Crawl queue of crawl.py; a claim expires if an artist takes longer
+    "crawl_queue_file": "data/crawl_queue.sqlite",
+    "crawl_shards": 64,
+    "crawl_lease_sec": 3600,
+    "crawl_max_attempts": 3,
+    # Concurrent downloads, requests per second (of all crawl.py workers)
+    # and retries with backoff
+    "scrape_workers": 8,
+    "scrape_per_host": 4,
+    "scrape_rate": 2.0,
+    "scrape_burst": 4,
+    "scrape_retries": 3,
+    "scrape_backoff_sec": 2.0,
+    # Compressed store of the scraped pages, False for one file per page
+    "html_store": True,
+    "html_store_path": "scrape/_store/",
+    "html_store_shard_mb": 256,
+    "html_store_level": 9,
+    # Count live, remastered, ... versions of a song as duplicate URLs
+    "dedup_normalize_titles": True,
+    # Remove near-duplicate songs and lines above these Jaccard similarities
+    "dedup_songs": True,
+    "dedup_song_threshold": 0.8,
+    "dedup_lines": True,
+    "dedup_line_threshold": 0.9,
+    "dedup_num_perm": 64,
+    # BeautifulSoup backend (html.parser if lxml is not installed) and cache
+    "html_parser": "lxml",
+    "parse_n_jobs": -1,
+    "parse_chunk_size": 64,
+    "parse_min_parallel": 500,
+    "parse_cache": True,
+    "parse_cache_file": "data/parse_cache.sqlite",
+    # Memory-map the Parquet line corpus
+    "corpus_memory_map": True,
+    # Hyperparameter search: "cached", "grid", "halving" or "random"
+    "search": "cached",
+    "search_n_iter": 10,
+    # Train on int32 token ids and label codes (only with the cached search)
+    "train_encoded": True,
+    # Train chunk by chunk with a HashingVectorizer; with streaming_update,
+    # fold data/<streaming_update_file>.parquet or .csv into the saved model
+    "train_streaming": False,
+    "streaming_update": False,
+    "streaming_update_file": "songs_by_line_update",
+    "streaming_chunk_size": 100000,
+    "streaming_ngram_range": (1, 2),
+    "streaming_n_features": 2**20,
+    "streaming_alpha": 0.1,
+    # Export the model as NumPy arrays for predict.py --artifact
+    "export_artifact": True,
+    "model_artifact_path": "models/trained_model/",
+    "predict_chunk_size": 10000,
+    # NLTK data directory, downloaded there if missing and nltk_download is set
+    "nltk_data_path": "data/nltk/",
+    "nltk_download": True,
+    # Lemma table built after training, used before WordNet
+    "lemma_table": True,
+    "lemma_table_file": "models/lemma_table.json",
+    "lemma_word_list": "data/common_words.txt",
+    # Preprocessing caches and process pool
+    "lemma_cache_size": 100000,
+    "line_cache_size": 100000,
+    "preprocess_n_jobs": -1,
+    "preprocess_chunk_size": 10000,
+    "preprocess_min_parallel": 50000,
+    "preprocess_cache": True,
+    "preprocess_cache_path": "data/preprocessed/",
+    "preprocess_cache_keep": 3,
+    # Prediction server of serve.py and its micro-batches
+    "serve_host": "127.0.0.1",
+    "serve_port": 8000,
+    "serve_max_batch_size": 256,
+    "serve_max_wait_ms": 10,
     "header": {
         "user_agent": "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:108.0) Gecko/20100101 Firefox/108.0"
     },
+    "base_url": "https://www.lyrics.com",
     "artist_urls": {
         "Eels": "https://www.lyrics.com/artist.php?name=Eels&aid=182509&o=1",
         "Rage Against the Machine": "https://www.lyrics.com/artist.php?name=Rage-Against-the-Machine&aid=23206&o=1",
@@ -0,0 +1,121 @@
+"""
+Tests of the artist short names, the SQLite crawl queue and its rate limit.
+"""
+
+import pytest
+
+from includes import catalogue, crawl, scrape
+from settings import conf
+
+
+@pytest.fixture(name="queue_file")
+def fixture_queue_file(tmp_path, monkeypatch) -> str:
+    """
+    Fixture with the path of an empty queue database and one shard.
+    """
+    monkeypatch.setitem(conf, "crawl_shards", 1)
+
+    return str(tmp_path / "crawl_queue.sqlite")
+
+
+def test_slugs_stay_when_manifest_grows(queue_file):
+    """
+    Adding an artist with the same initials doesn't rename the first one.
+    """
+    connection = catalogue.open_slugs(queue_file)
+
+    slugs = catalogue.assign_slugs([{"artist": "Arctic Monkeys"}], connection)
+    assert slugs == {"Arctic Monkeys": "am"}
+
+    slugs = catalogue.assign_slugs(
+        [{"artist": "Arctic Monkeys"}, {"artist": "Alien Mob"}], connection
+    )
+    assert slugs["Arctic Monkeys"] == "am"
+    assert slugs["Alien Mob"].startswith("am-")
+
+    connection.close()
+
+
+def test_colliding_new_artists_get_suffixes(queue_file):
+    """
+    New artists sharing initials both get a suffix, set slugs are kept.
+    """
+    connection = catalogue.open_slugs(queue_file)
+
+    slugs = catalogue.assign_slugs(
+        [
+            {"artist": "Arctic Monkeys"},
+            {"artist": "Alien Mob"},
+            {"artist": "Adele", "slug": "adele-uk"},
+        ],
+        connection,
+    )
+    assert slugs["Arctic Monkeys"].startswith("am-")
+    assert slugs["Alien Mob"].startswith("am-")
+    assert slugs["Arctic Monkeys"] != slugs["Alien Mob"]
+    assert slugs["Adele"] == "adele-uk"
+
+    with pytest.raises(ValueError):
+        catalogue.assign_slugs([{"artist": "Other", "slug": "adele-uk"}], connection)
+
+    connection.close()
+
+
+def test_renewed_claim_is_not_taken(queue_file):
+    """
+    A worker renewing its lease keeps its shard.
+    """
+    connection = crawl.open_queue(queue_file)
+    crawl.enqueue_artists(connection, {"A": "url-a", "B": "url-b"})
+
+    shard, artist_urls = crawl.claim_shard(connection, "w1")
+    assert shard == 0 and set(artist_urls) == {"A", "B"}
+
+    assert crawl.renew_claim(connection, "w1") == {"A", "B"}
+    assert crawl.claim_shard(connection, "w2") is None
+
+    assert crawl.finish_artists(connection, "w1", ["A"], success=True) == 1
+    assert crawl.finish_artists(connection, "w1", ["B"], success=False) == 1
+    assert crawl.queue_status(connection) == {"done": 1, "pending": 1}
+
+    connection.close()
+
+
+def test_expired_claim_is_lost(queue_file):
+    """
+    After the lease expired, another worker claims the shard and the
+    first worker's results no longer change the queue.
+    """
+    connection = crawl.open_queue(queue_file)
+    crawl.enqueue_artists(connection, {"A": "url-a"})
+    crawl.claim_shard(connection, "w1")
+
+    # Let the lease expire
+    connection.execute(
+        "UPDATE crawl_queue SET claimed_at = claimed_at - ?",
+        (conf["crawl_lease_sec"] + 1,),
+    )
+
+    assert crawl.claim_shard(connection, "w2") == (0, {"A": "url-a"})
+    assert crawl.renew_claim(connection, "w1") == set()
+    assert crawl.finish_artists(connection, "w1", ["A"], success=True) == 0
+    assert crawl.queue_status(connection) == {"claimed": 1}
+
+    connection.close()
+
+
+def test_workers_share_the_rate(monkeypatch):
+    """
+    Every worker gets its share of the rate, kept across downloads.
+    """
+    monkeypatch.setitem(conf, "scrape_rate", 4.0)
+    monkeypatch.setitem(conf, "scrape_burst", 4)
+    scrape.get_rate_limiter.cache_clear()
+
+    scrape.share_rate(4)
+    rate_limiter = scrape.get_rate_limiter()
+
+    assert (rate_limiter.rate, rate_limiter.capacity) == (1.0, 1.0)
+    assert scrape.get_rate_limiter() is rate_limiter
+
+    scrape.get_rate_limiter.cache_clear()
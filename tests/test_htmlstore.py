@@ -0,0 +1,87 @@
+"""
+Tests of the compressed HTML store.
+"""
+
+import os
+
+import pytest
+
+from includes import htmlstore
+from settings import conf
+
+PAGE = "<html><head><title>{title}</title></head><body>{body}</body></html>"
+
+
+@pytest.fixture(name="connection")
+def fixture_connection(tmp_path, monkeypatch):
+    """
+    Fixture with an empty store in a temporary base path.
+    """
+    monkeypatch.setitem(conf, "base_path", str(tmp_path) + "/")
+    connection = htmlstore.open_store()
+
+    yield connection
+
+    connection.close()
+
+
+def test_pages_read_back_unchanged(connection):
+    """
+    Stored pages are read back as they were stored.
+    """
+    pages = {
+        f"ab/song-{i}.html": PAGE.format(title=f"Song {i}", body="la " * i)
+        for i in range(5)
+    }
+
+    for key, html in pages.items():
+        htmlstore.put_page(connection, key, html)
+
+    assert htmlstore.get_keys(connection, ["ab"]) == set(pages)
+    for key, html in pages.items():
+        assert htmlstore.get_page(connection, key) == html
+    assert htmlstore.get_page(connection, "ab/missing.html") is None
+
+
+def test_same_content_is_stored_once(connection):
+    """
+    A page with the content of a stored page is only added to the index.
+    """
+    html = PAGE.format(title="Song", body="Lyrics")
+
+    assert htmlstore.put_page(connection, "ab/song.html", html)
+    size = os.path.getsize(htmlstore.shard_file(0))
+
+    assert not htmlstore.put_page(connection, "cd/song.html", html)
+    assert os.path.getsize(htmlstore.shard_file(0)) == size
+    assert htmlstore.get_page(connection, "cd/song.html") == html
+
+
+def test_pack_directory(connection):
+    """
+    HTML files of an artist are moved into the store.
+    """
+    dir_path = conf["base_path"] + conf["scrape_path"] + "ab/"
+    os.makedirs(dir_path)
+    pages = {f"song-{i}.html": PAGE.format(title=i, body=i) for i in range(3)}
+    for file_name, html in pages.items():
+        with open(dir_path + file_name, "w", encoding="utf-8") as file:
+            file.write(html)
+
+    assert htmlstore.pack_directory(connection, "ab") == 3
+    assert not os.path.isdir(dir_path)
+    for file_name, html in pages.items():
+        assert htmlstore.get_page(connection, f"ab/{file_name}") == html
+
+
+def test_pack_artists_skips_missing_directories(connection):
+    """
+    Only artists with a scrape directory have files to pack.
+    """
+    dir_path = conf["base_path"] + conf["scrape_path"] + "ab/"
+    os.makedirs(dir_path)
+    with open(dir_path + "song.html", "w", encoding="utf-8") as file:
+        file.write(PAGE.format(title="Song", body="Lyrics"))
+
+    assert htmlstore.pack_artists(connection, ["ab", "cd"]) == 1
+    assert htmlstore.get_keys(connection, ["ab", "cd"]) == {"ab/song.html"}
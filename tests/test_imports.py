@@ -0,0 +1,24 @@
+"""
+Tests of the import time check of predict.py. They run without the NLTK
+data, because importing predict.py must not load or download it.
+"""
+
+from includes import benchmark
+
+
+def test_predict_imports_no_training_modules():
+    """
+    predict.py must not import training or plotting modules.
+    """
+    result = benchmark.measure_import_time("predict", repeat=1)
+
+    assert benchmark.check_import_time(result) == []
+
+
+def test_predict_imports_no_nltk():
+    """
+    nltk is imported on first use, after the NLTK data was checked.
+    """
+    result = benchmark.measure_import_time("predict", repeat=1)
+
+    assert benchmark.check_import_time(result, excluded=["nltk"]) == []
@@ -0,0 +1,148 @@
+"""
+Tests of the inference paths: the equivalence of the NumPy engine, the
+exported model and the encoded training with the scikit-learn pipeline.
+"""
+
+import os
+
+import joblib
+import numpy as np
+import pytest
+
+from includes import misc
+
+# The first use of nltk downloads missing NLTK data, the tests don't
+if not all(misc.find_nltk_data(data_type) for data_type in misc.NLTK_RESOURCES):
+    pytest.skip("NLTK data not installed", allow_module_level=True)
+
+# pylint: disable=wrong-import-position
+from includes import artifact, engine, modelling  # noqa: E402
+
+
+@pytest.fixture(name="corpus")
+def fixture_corpus() -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fixture with synthetic lines of three artists with different numbers
+    of lines, so that SMOTE has to oversample.
+    """
+    rng = np.random.default_rng(0)
+    shared = [f"word{i}" for i in range(200)]
+
+    lines, labels = [], []
+    for artist, n_lines in [("Adele", 300), ("Eels", 200), ("Rage", 120)]:
+        own = [f"{artist.lower()}{i}" for i in range(50)]
+        for _ in range(n_lines):
+            lines.append(" ".join(rng.choice(shared + own, size=8)))
+            labels.append(artist)
+
+    return np.array(lines, dtype=object), np.array(labels)
+
+
+def fit_pipeline(lines: np.ndarray, labels: np.ndarray):
+    """
+    Function to fit the project's pipeline reproducibly.
+    """
+    model = modelling.create_pipeline()
+    model.set_params(tdidf__ngram_range=(1, 2), smote__random_state=0)
+
+    return model.fit(lines, labels)
+
+
+def test_engine_matches_pipeline(corpus):
+    """
+    The engine returns the pipeline's predictions and probabilities.
+    """
+    lines, labels = corpus
+    model = fit_pipeline(lines, labels)
+    model_engine = engine.InferenceEngine.from_pipeline(model)
+
+    queries = list(lines[::7]) + ["word1 word2", "unknown words only", ""]
+
+    np.testing.assert_array_equal(model_engine.classes_, model.classes_)
+    np.testing.assert_array_equal(model_engine.predict(queries), model.predict(queries))
+    np.testing.assert_array_equal(
+        model_engine.predict_proba(queries), model.predict_proba(queries)
+    )
+
+
+def test_artifact_matches_pipeline(corpus, tmp_path):
+    """
+    The exported, memory-mapped model predicts like the pipeline.
+    """
+    lines, labels = corpus
+    model = fit_pipeline(lines, labels)
+
+    artifact.export_model(model, dir_path=str(tmp_path))
+    model_artifact = artifact.load_artifact(str(tmp_path))
+
+    queries = list(lines[::7])
+
+    np.testing.assert_array_equal(
+        model_artifact.predict(queries), model.predict(queries)
+    )
+    np.testing.assert_allclose(
+        model_artifact.predict_proba(queries), model.predict_proba(queries), rtol=1e-12
+    )
+
+
+def test_export_keeps_mapped_artifact(corpus, tmp_path):
+    """
+    Exporting again doesn't change an artifact mapped by another process,
+    and a retrained pickle makes the export outdated.
+    """
+    lines, labels = corpus
+    model = fit_pipeline(lines, labels)
+    model_file = str(tmp_path / "model.pkl")
+    dir_path = str(tmp_path / "artifact")
+    joblib.dump(model, model_file)
+
+    artifact.export_model(model, dir_path=dir_path, model_file=model_file)
+    model_old = artifact.load_artifact(dir_path)
+    assert artifact.is_current(model_file, dir_path)
+
+    model_new = fit_pipeline(lines[::2], labels[::2])
+    joblib.dump(model_new, model_file)
+    assert not artifact.is_current(model_file, dir_path)
+
+    artifact.export_model(model_new, dir_path=dir_path, model_file=model_file)
+    assert artifact.is_current(model_file, dir_path)
+    assert len([path for path in os.listdir(dir_path) if path != "meta.json"]) == 1
+
+    queries = list(lines[::7])
+    np.testing.assert_array_equal(model_old.predict(queries), model.predict(queries))
+    np.testing.assert_array_equal(
+        artifact.load_artifact(dir_path).predict(queries), model_new.predict(queries)
+    )
+
+
+def test_engine_refuses_streaming_model():
+    """
+    Streaming models have no vocabulary and can't be used by the engine.
+    """
+    with pytest.raises(ValueError):
+        engine.InferenceEngine.from_pipeline(modelling.create_streaming_pipeline())
+
+
+def test_fit_encoded_matches_pipeline(corpus):
+    """
+    Fitting on token ids and label codes gives the pipeline's model.
+    """
+    lines, labels = corpus
+    model = fit_pipeline(lines, labels)
+
+    classes, codes = np.unique(labels, return_inverse=True)
+    model_encoded = modelling.create_pipeline()
+    model_encoded.set_params(tdidf__ngram_range=(1, 2), smote__random_state=0)
+    model_encoded = modelling.fit_encoded(
+        model_encoded, list(lines), codes.astype(np.int32), classes
+    )
+
+    vectorizer = model.named_steps["tdidf"]
+    vectorizer_encoded = model_encoded.named_steps["tdidf"]
+
+    assert vectorizer_encoded.vocabulary_ == vectorizer.vocabulary_
+    np.testing.assert_allclose(vectorizer_encoded.idf_, vectorizer.idf_)
+    np.testing.assert_array_equal(model_encoded.classes_, model.classes_)
+    np.testing.assert_allclose(
+        model_encoded.predict_proba(lines[::7]), model.predict_proba(lines[::7])
+    )
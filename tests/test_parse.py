@@ -0,0 +1,26 @@
+"""
+Tests of parsing song pages with the markup of lyrics.com.
+"""
+
+from includes import benchmark, parse
+from settings import conf
+
+
+def test_fixture_pages_parse():
+    """
+    Title, artist and lyrics are found among the site's boilerplate.
+    """
+    pages = benchmark.load_fixture_pages()
+    assert pages
+
+    for html in pages:
+        title, artist, lyrics = parse.parse_html(html)
+        assert title and artist and lyrics
+        assert "googletag" not in lyrics
+
+    file_name = conf["base_path"] + benchmark.FIXTURE_PATH + "auld-lang-syne.html"
+    with open(file_name, "r", encoding="utf-8") as file:
+        title, artist, lyrics = parse.parse_html(file.read())
+
+    assert (title, artist) == ("Auld Lang Syne (Live)", "Robert Burns")
+    assert lyrics.startswith("Should auld acquaintance be forgot,\n")
@@ -0,0 +1,65 @@
+"""
+Tests of the pipeline of stages.
+"""
+
+import pytest
+
+from includes import workflow
+
+
+def write_file(path: str) -> None:
+    """
+    Function to write a small file as output of a stage.
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(path)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_stages_run_once(tmp_path, max_workers):
+    """
+    Stages run in dependency order and are skipped when nothing changed.
+    """
+    source, middle, target = (str(tmp_path / name) for name in ["a", "b", "c"])
+    write_file(source)
+    stages = [
+        workflow.Stage("second", lambda: write_file(target), [middle], [target]),
+        workflow.Stage("first", lambda: write_file(middle), [source], [middle]),
+    ]
+    state_file = str(tmp_path / "state.json")
+
+    status = workflow.run_pipeline(stages, [], max_workers, state_file)
+    assert status == {"first": "ran", "second": "ran"}
+
+    status = workflow.run_pipeline(stages, [], max_workers, state_file)
+    assert status == {"first": "up to date", "second": "up to date"}
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_missing_input_is_an_error(tmp_path, max_workers):
+    """
+    A missing input fails the run and names the disabled stage creating it.
+    """
+    source, target = str(tmp_path / "a"), str(tmp_path / "b")
+    stages = [
+        workflow.Stage("first", lambda: None, [], [source], enabled=False),
+        workflow.Stage("second", lambda: write_file(target), [source], [target]),
+    ]
+
+    with pytest.raises(FileNotFoundError, match="disabled stage first"):
+        workflow.run_pipeline(stages, [], max_workers, str(tmp_path / "state.json"))
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_cycle_is_an_error(tmp_path, max_workers):
+    """
+    Stages reading each other's outputs are never ready to run.
+    """
+    first, second = str(tmp_path / "a"), str(tmp_path / "b")
+    stages = [
+        workflow.Stage("first", lambda: None, [second], [first]),
+        workflow.Stage("second", lambda: None, [first], [second]),
+    ]
+
+    with pytest.raises(RuntimeError, match="cycle"):
+        workflow.run_pipeline(stages, [], max_workers, str(tmp_path / "state.json"))